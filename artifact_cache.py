@@ -0,0 +1,131 @@
+import concurrent.futures
+import hashlib
+import json
+import mmap
+import os
+import time
+
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".artifact_hashes.json")
+HASH_CHUNK_SIZE = 64 * 1024 * 1024 # 64 MiB
+
+# return: the fields identifying the current content of a file,
+#         [size, mtime (in ns), inode]
+def get_file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+# A persistent cache of the hashes of artifact files.
+#
+# Registering an artifact hashes its whole file, which takes minutes for the
+# multi-GB disk images. The cache maps the real path of a file to its
+# signature (size, mtime, inode) and its hash; a file whose signature has
+# not changed since it was hashed is not hashed again.
+class ArtifactHashCache:
+    def __init__(self, path = CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    # return: the cached hash of the file, or None if the file has changed
+    def get(self, path):
+        entry = self.entries.get(os.path.realpath(path), None)
+        if entry is None or not entry['signature'] == get_file_signature(path):
+            return None
+        return entry['hash']
+
+    def put(self, path, signature, file_hash):
+        self.entries[os.path.realpath(path)] = {'signature': signature, 'hash': file_hash}
+
+    def save(self):
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent = 1)
+        os.replace(tmp_path, self.path)
+
+    # Returns the hash of the file, computing it with `hash_function` and
+    # saving it in the cache if the file is not in the cache.
+    def get_hash(self, path, hash_function):
+        file_hash = self.get(path)
+        if file_hash is None:
+            # take the signature before hashing, so that a file modified
+            # while being hashed is hashed again next time
+            signature = get_file_signature(path)
+            file_hash = hash_function(path)
+            self.put(path, signature, file_hash)
+            self.save()
+        return file_hash
+
+# Returns the md5 hash of a file, as gem5art's getHash() does, reading the
+# file through a memory map in large chunks. hashlib releases the GIL while
+# hashing large buffers, so several files can be hashed by threads in parallel.
+def md5_file(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0: # empty files cannot be memory mapped
+            return md5.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            if hasattr(data, 'madvise'):
+                data.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(data) as view:
+                for offset in range(0, size, HASH_CHUNK_SIZE):
+                    md5.update(view[offset:offset + HASH_CHUNK_SIZE])
+    return md5.hexdigest()
+
+_cache = None
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = ArtifactHashCache(CACHE_FILE)
+    return _cache
+
+# Makes gem5art look up the hashes of artifact files in the cache.
+# This should be called before registering any artifact.
+def install():
+    import gem5art.artifact.artifact as gem5art_artifact
+    if getattr(gem5art_artifact.getHash, 'is_cached', False):
+        return
+    uncached_get_hash = gem5art_artifact.getHash
+    def cached_get_hash(path):
+        return get_cache().get_hash(path, uncached_get_hash)
+    cached_get_hash.is_cached = True
+    cached_get_hash.uncached = uncached_get_hash
+    gem5art_artifact.getHash = cached_get_hash
+
+# Hashes the artifact files that are not in the cache yet with a pool of
+# `workers` threads, and saves their hashes in the cache, so that registering
+# the artifacts afterwards does not hash any file. Paths that do not exist or
+# that are not files (e.g. git repos) are skipped.
+def prefetch_hashes(paths, workers = 8):
+    cache = get_cache()
+    paths = sorted({path for path in paths if os.path.isfile(path) and cache.get(path) is None})
+    if not paths:
+        return
+
+    def hash_file(path):
+        signature = get_file_signature(path)
+        start_time = time.time()
+        file_hash = md5_file(path)
+        return signature, file_hash, time.time() - start_time
+
+    total_size = sum(os.path.getsize(path) for path in paths)
+    print("Hashing {} artifact files ({:.1f} GB)".format(len(paths), total_size / 1e9))
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers = workers) as executor:
+        futures = {executor.submit(hash_file, path): path for path in paths}
+        for n_done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            path = futures[future]
+            signature, file_hash, elapsed_time = future.result()
+            cache.put(path, signature, file_hash)
+            size = signature[0]
+            print("[{}/{}] Hashed {} ({:.1f} MB) in {:.1f} s, {:.1f} MB/s".format(
+                  n_done, len(paths), path, size / 1e6, elapsed_time, size / 1e6 / max(elapsed_time, 1e-6)))
+    cache.save()
+    elapsed_time = time.time() - start_time
+    print("Hashed {:.1f} GB in {:.1f} s, {:.1f} MB/s".format(
+          total_size / 1e9, elapsed_time, total_size / 1e6 / max(elapsed_time, 1e-6)))
@@ -0,0 +1,419 @@
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import json
+import math
+import multiprocessing as mp
+import os
+import platform
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+import input_space
+import launch_tests
+from launch_tests import job_id, get_outdir
+import ledger
+import result_cache
+from runtime_model import RuntimeModel, longest_expected_first
+from job_scheduler import JobScheduler, job_cost
+from detectors import pop_detector_set
+
+# Measures the overheads of the launcher itself, stage by stage, on a
+# workspace laid out like this repo (gem5 builds, kernels, disk images, git
+# repos) in which the gem5 binaries are fake_gem5.py and the artifact
+# database is a local file, so that no simulation runs and no MongoDB server
+# is needed:
+#  - enumerate: enumerating and filtering the jobs (get_jobs_iterator);
+#  - order: ordering the jobs by expected runtime (longest_expected_first);
+#  - register: registering the artifacts (load_artifacts), with an empty
+#    database and an empty hash cache;
+#  - build: building the gem5art run of each job (create_fs_run);
+#  - supervise: running the jobs with JobScheduler, with the supervisor or
+#    with a pool of workers, and recording them as the launcher does.
+#
+# The campaign is scaled to 10k-100k jobs by replicating the values of a
+# param that no filter reads (the workloads, and the boot types of
+# boot-exit), so the scaled campaign has the shape of the real one.
+#
+# The results are written as JSON, with the commit of the repo and the host,
+# so that runs of the benchmark on different commits can be compared.
+
+BENCHMARKS = ['boot-exit', 'npb', 'gapbs', 'parsec', 'spec-2006', 'spec-2017']
+# the param of each benchmark replicated to scale the campaign
+SCALED_FIELDS = {'boot-exit': 'boot_types'}
+DEFAULT_SCALED_FIELD = 'workloads'
+RUBY_MEM_TYPES = ['MI_example', 'MESI_Two_Level', 'MOESI_CMP_directory']
+FAKE_GEM5 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_gem5.py")
+
+# A stand-in for the MongoDB artifact database of gem5art: the documents are
+# kept in memory and appended to a JSON-lines file, and the uploaded files are
+# copied into a folder next to it. It is selected with
+# GEM5ART_DB=file:///path/to/db.jsonl, unless the installed gem5art already
+# has a database for this scheme, which is then used instead.
+class LocalArtifactDB:
+    def __init__(self, uri):
+        self.path = urlparse(uri).path
+        self.files_folder = self.path + ".files"
+        os.makedirs(self.files_folder, exist_ok = True)
+        self.documents = {} # _id -> document
+        self.ids = {} # hash -> _id
+
+    def put(self, key, artifact):
+        self.documents[key] = artifact
+        if 'hash' in artifact:
+            self.ids.setdefault(artifact['hash'], key)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(artifact, default = str) + "\n")
+
+    def upload(self, key, path):
+        shutil.copyfile(path, os.path.join(self.files_folder, str(key)))
+
+    def __contains__(self, key):
+        if isinstance(key, str):
+            return key in self.ids
+        return key in self.documents
+
+    def get(self, key):
+        if isinstance(key, str):
+            key = self.ids.get(key, None)
+        return self.documents.get(key, None)
+
+    def downloadFile(self, key, path):
+        shutil.copyfile(os.path.join(self.files_folder, str(key)), path)
+
+    def search(self, predicate, limit):
+        documents = (document for document in self.documents.values() if predicate(document))
+        return itertools.islice(documents, limit) if limit else documents
+
+    def searchByName(self, name, limit):
+        return self.search(lambda document: document['name'] == name, limit)
+
+    def searchByType(self, typ, limit):
+        return self.search(lambda document: document['type'] == typ, limit)
+
+    def searchByNameType(self, name, typ, limit):
+        return self.search(lambda document: document['name'] == name and document['type'] == typ, limit)
+
+    def searchByLikeNameType(self, name, typ, limit):
+        return self.search(lambda document: document['type'] == typ and name in document['name'], limit)
+
+# Makes gem5art use a new, empty local database at `path`.
+#
+# gem5art has no public way of adding a database type, so LocalArtifactDB is
+# registered in the table of the database types of gem5art 1.3, and this
+# fails with an error if the installed gem5art has no such table. The
+# database is then opened with the public `getDBConnection(uri)`, which
+# replaces the current connection, and GEM5ART_DB is set for the processes
+# started afterwards.
+def connect_local_artifact_db(path):
+    from gem5art.artifact import _artifactdb, getDBConnection
+    db_schemes = getattr(_artifactdb, '_db_schemes', None)
+    if not isinstance(db_schemes, dict):
+        raise RuntimeError("cannot register a local artifact database: the installed gem5art has no "
+                           "gem5art.artifact._artifactdb._db_schemes table, as gem5art 1.3 has")
+    db_schemes.setdefault('file', LocalArtifactDB)
+    uri = 'file://' + path
+    os.environ['GEM5ART_DB'] = uri
+    return getDBConnection(uri)
+
+# Writes a file of `size` bytes starting with its name, so that no two files have the same hash (gem5art registers
+# files with the same hash as one artifact), and the hashes of the workspace are reproducible.
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    block = bytes(range(256)) * 4096 # 1 MiB
+    with open(path, 'wb') as f:
+        header = os.path.basename(path).encode()[:size]
+        f.write(header)
+        for offset in range(len(header), size, len(block)):
+            f.write(block[:size - offset])
+
+def init_git_repo(path):
+    os.makedirs(path, exist_ok = True)
+    def git(*args):
+        subprocess.run(['git', '-c', 'user.name=bench', '-c', 'user.email=bench@localhost', *args],
+                       cwd = path, check = True, stdout = subprocess.DEVNULL)
+    git('init', '-q')
+    git('remote', 'add', 'origin', 'https://localhost/{}'.format(os.path.basename(os.path.normpath(path))))
+    with open(os.path.join(path, "README"), 'w') as f:
+        f.write("benchmark workspace\n")
+    git('add', 'README')
+    git('commit', '-q', '-m', 'Benchmark workspace')
+
+# Creates the files and git repos that the artifacts of common_artifacts.py and tests_artifacts.py point to, with the
+# gem5 binaries replaced by fake_gem5.py and disk images of `disk_image_bytes` bytes.
+def create_workspace(workspace, disk_image_bytes):
+    init_git_repo(workspace)
+    gem5_folder = os.path.join(workspace, "gem5")
+    init_git_repo(gem5_folder)
+    for build in ["X86"] + ["X86_" + mem for mem in RUBY_MEM_TYPES]:
+        path = os.path.join(gem5_folder, "build", build, "gem5.opt")
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with open(path, 'w') as f: # a script per build, so that each build is a different artifact
+            f.write("#!/bin/sh\n# gem5 {}\nexec {} {} \"$@\"\n".format(build, sys.executable, FAKE_GEM5))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    write_file(os.path.join(gem5_folder, "util/m5/build/x86/out/m5"), 1 << 20)
+    write_file(os.path.join(workspace, "packer"), 1 << 20)
+    kernels = {kernel for params in input_space.name_params_map.values() for kernel in params.kernels}
+    for kernel in sorted(kernels):
+        write_file(os.path.join(workspace, "linux-kernels", "vmlinux-" + kernel), 1 << 20)
+    for image in sorted(set(launch_tests.name_disk_image_map.values())):
+        write_file(os.path.join(workspace, "disk-images", image), disk_image_bytes)
+    for name in BENCHMARKS: # the folders the disk images of gem5-resources are built in
+        os.makedirs(os.path.join(workspace, "gem5-resources/src", name, "disk-image"), exist_ok = True)
+
+# Points the launcher at the workspace, in this process and in the worker processes it forks.
+def configure_launcher(workspace, output_folder):
+    os.chdir(workspace) # the paths of the artifacts are relative
+    launch_tests.GEM5_FOLDER = os.path.join(workspace, "gem5/")
+    launch_tests.GEM5_RESOURCES_FOLDER = os.path.join(workspace, "gem5-resources/")
+    launch_tests.DISK_IMAGES_FOLDER = os.path.join(workspace, "disk-images/")
+    launch_tests.LINUX_KERNELS_FOLDER = os.path.join(workspace, "linux-kernels/")
+    launch_tests.PACKER_PATH = os.path.join(workspace, "packer")
+    launch_tests.ERR_FOLDER = os.path.join(workspace, "error_logs/")
+    launch_tests.OUTPUT_FOLDER = output_folder
+    import artifact_cache
+    artifact_cache.CACHE_FILE = os.path.join(workspace, ".artifact_hashes.json")
+
+_base_params = {}
+
+# Replicates the values of the scaled param of each benchmark `factor` times, e.g. 'is.A.x', 'is.A.x~1', ...
+def scale_input_space(factor):
+    for name in BENCHMARKS:
+        params = input_space.name_params_map[name]
+        field = SCALED_FIELDS.get(name, DEFAULT_SCALED_FIELD)
+        values = _base_params.setdefault((name, field), getattr(params, field))
+        setattr(params, field, values + ["{}~{}".format(value, replica) for replica in range(1, factor) for value in values])
+
+# return: the first `n_jobs` jobs of the campaign scaled to at least `n_jobs` jobs
+def get_scaled_jobs_iterator(n_jobs):
+    scale_input_space(1)
+    base_count = sum(1 for _ in launch_tests.get_jobs_iterator())
+    scale_input_space(math.ceil(n_jobs / base_count))
+    return itertools.islice(launch_tests.get_jobs_iterator(), n_jobs)
+
+# return: the value at `fraction` of the sorted values, by the nearest-rank method
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+# Summarizes the measurements of a stage: the duration of each repeat and the latency of each item (in seconds).
+def summarize(stage, n_items, durations, latencies, **extra):
+    latencies = sorted(latencies)
+    median_duration = sorted(durations)[len(durations) // 2]
+    summary = {
+        'stage': stage,
+        'items': n_items,
+        'repeats': len(durations),
+        'seconds': {'median': median_duration, 'min': min(durations), 'max': max(durations)},
+        'throughput': n_items / median_duration if median_duration > 0 else None, # items per second
+        'latency_us': {'p50': percentile(latencies, 0.5) * 1e6, 'p90': percentile(latencies, 0.9) * 1e6,
+                       'p99': percentile(latencies, 0.99) * 1e6, 'max': latencies[-1] * 1e6,
+                       'mean': sum(latencies) / len(latencies) * 1e6} if latencies else None
+    }
+    summary.update(extra)
+    return summary
+
+def bench_enumerate(n_jobs, repeats):
+    durations = []
+    latencies = []
+    for _ in range(repeats):
+        jobs = get_scaled_jobs_iterator(n_jobs)
+        start_time = previous_time = time.perf_counter()
+        for _ in jobs:
+            now = time.perf_counter()
+            latencies.append(now - previous_time)
+            previous_time = now
+        durations.append(time.perf_counter() - start_time)
+    return summarize('enumerate', n_jobs, durations, latencies)
+
+def bench_order(n_jobs, repeats, workspace):
+    jobs = list(get_scaled_jobs_iterator(n_jobs))
+    durations = []
+    for repeat in range(repeats):
+        model = RuntimeModel(os.path.join(workspace, "runtime_history.{}.jsonl".format(repeat)))
+        start_time = time.perf_counter()
+        for _ in longest_expected_first(jobs, model):
+            pass
+        durations.append(time.perf_counter() - start_time)
+    return summarize('order', n_jobs, durations, [])
+
+# Registers the artifacts of all the benchmarks, as the launcher does before creating the runs, in a new process
+# (the common artifacts are registered when common_artifacts.py is imported).
+#
+# return: (duration, latency of each registered artifact)
+def measure_registration(workspace, db_path):
+    configure_launcher(workspace, os.path.join(workspace, "outputs/"))
+    if os.path.exists(launch_tests.artifact_cache.CACHE_FILE):
+        os.remove(launch_tests.artifact_cache.CACHE_FILE)
+    connect_local_artifact_db(db_path)
+    from gem5art.artifact.artifact import Artifact
+    register = Artifact.registerArtifact.__func__
+    latencies = []
+    def timed_register(cls, *args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return register(cls, *args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start_time)
+    Artifact.registerArtifact = classmethod(timed_register)
+    start_time = time.perf_counter()
+    launch_tests.load_artifacts(BENCHMARKS)
+    return time.perf_counter() - start_time, latencies
+
+def bench_register(repeats, workspace):
+    durations = []
+    latencies = []
+    context = mp.get_context('spawn')
+    for repeat in range(repeats):
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context = context) as executor:
+            duration, repeat_latencies = executor.submit(
+                measure_registration, workspace, os.path.join(workspace, "register.{}.db.jsonl".format(repeat))).result()
+        durations.append(duration)
+        latencies.extend(repeat_latencies)
+    return summarize('register', len(latencies) // repeats, durations, latencies)
+
+def bench_build(n_jobs, repeats):
+    jobs = list(get_scaled_jobs_iterator(n_jobs))
+    durations = []
+    latencies = []
+    errors = collections.Counter()
+    for repeat in range(repeats):
+        start_time = time.perf_counter()
+        for name, params in jobs:
+            job_start_time = time.perf_counter()
+            try:
+                run = launch_tests.create_fs_run(name, params)
+                pop_detector_set(run.outdir) # the run is never run
+            except Exception as err:
+                if repeat == 0:
+                    errors["{}: {}".format(type(err).__name__, err)] += 1
+                continue
+            latencies.append(time.perf_counter() - job_start_time)
+        durations.append(time.perf_counter() - start_time)
+    return summarize('build', n_jobs, durations, latencies, errors = dict(errors))
+
+# Runs the jobs with JobScheduler as the launcher does (without the optional features), with `delay` seconds per run.
+# The latency of a job is the time from its dispatch to the end of its `on_done`, less the runtime of the fake gem5.
+def bench_supervise(n_jobs, repeats, workspace, mode, cores, delay, check_interval):
+    jobs = [job for job in get_scaled_jobs_iterator(n_jobs) if not job.name == 'parsec' or job.params['kernel'] in launch_tests.linux_binaries]
+    os.environ['FAKE_GEM5_DELAY'] = str(delay)
+    launch_tests.GEM5RUN_CHECK_FAILURE_INTERVAL = check_interval
+    durations = []
+    latencies = []
+    statuses = collections.Counter()
+    for repeat in range(repeats):
+        configure_launcher(workspace, os.path.join(workspace, "outputs", "supervise.{}.{}".format(mode, repeat), ""))
+        connect_local_artifact_db(os.path.join(workspace, "supervise.{}.{}.db.jsonl".format(mode, repeat)))
+        runtime_model = RuntimeModel(os.path.join(workspace, "runtime_history.supervise.{}.{}.jsonl".format(mode, repeat)))
+        completion_ledger = ledger.CompletionLedger(os.path.join(workspace, "ledger.supervise.{}.{}.jsonl".format(mode, repeat)))
+        result_index = result_cache.ResultIndex(os.path.join(workspace, "result_index.supervise.{}.{}.jsonl".format(mode, repeat)))
+        dispatch_times = {}
+        def on_dispatch(job):
+            dispatch_times[job] = time.perf_counter()
+        def on_done(job, result):
+            name, params = job
+            runtime_model.record(name, params, result['status'], result['wall_time'])
+            completion_ledger.record(job_id(name, params), name, params, result['status'], get_outdir(name, params),
+                                     telemetry = result['telemetry'], failure_reason = result['failure_reason'],
+                                     failure_class = result['failure_class'], attempt = 1, result_key = result['result_key'])
+            if result['result_key'] is not None:
+                result_index.record(result['result_key'], get_outdir(name, params), job_id(name, params))
+            statuses[result['status']] += 1
+            latencies.append(time.perf_counter() - dispatch_times.pop(job) - delay)
+        pool_type = launch_tests.RunSupervisor if mode == 'supervisor' else lambda: mp.Pool(cores)
+        start_time = time.perf_counter()
+        with pool_type() as pool:
+            scheduler = JobScheduler(pool, launch_tests.supervised_worker if mode == 'supervisor' else launch_tests.worker,
+                                     cores, float('inf'), on_dispatch = on_dispatch, on_done = on_done)
+            scheduler.run(jobs)
+        durations.append(time.perf_counter() - start_time)
+    # the shortest possible makespan: the core-seconds of the runs spread over all the cores
+    ideal_duration = sum(min(job_cost(name, params)[0], cores) for name, params in jobs) * delay / cores
+    return summarize('supervise', len(jobs), durations, latencies, mode = mode, cores = cores, delay = delay,
+                     check_interval = check_interval, statuses = dict(statuses), ideal_seconds = ideal_duration)
+
+def get_repo_commit():
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd = repo, stderr = subprocess.DEVNULL).decode().strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd = repo).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+def format_summary(summary):
+    latency = summary['latency_us'] or {}
+    return "{:<10} {:>8} {:>10.3f} s {:>12.1f}/s   p50 {:>10} us   p99 {:>10} us".format(
+           summary['stage'], summary['items'], summary['seconds']['median'], summary['throughput'] or 0,
+           "{:.1f}".format(latency['p50']) if latency else "-", "{:.1f}".format(latency['p99']) if latency else "-")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the overheads of the launcher with a fake gem5 binary.')
+    parser.add_argument('--stages', nargs='+', default = ['enumerate', 'order', 'register', 'build', 'supervise'],
+                        choices = ['enumerate', 'order', 'register', 'build', 'supervise'])
+    parser.add_argument('--scales', type=int, nargs='+', default = [10000, 100000],
+                        help='numbers of jobs of the enumerate, order and build stages')
+    parser.add_argument('--supervise-jobs', type=int, default = 10000, help='number of jobs of the supervise stage')
+    parser.add_argument('--supervise-mode', choices = ['supervisor', 'pool'], default = 'supervisor',
+                        help='run the jobs from the launcher process (--supervisor) or from a pool of worker processes')
+    parser.add_argument('--cores', type=int, default = mp.cpu_count(), help='core budget of the supervise stage')
+    parser.add_argument('--delay', type=float, default = 0, help='runtime (in seconds) of each fake gem5 run')
+    parser.add_argument('--check-interval', type=float, default = launch_tests.GEM5RUN_CHECK_FAILURE_INTERVAL,
+                        help='how often (in seconds) the supervisor checks each run')
+    parser.add_argument('--repeats', type=int, default = 3, help='number of measurements of each stage')
+    parser.add_argument('--disk-image-mb', type=int, default = 16, help='size of the fake disk images')
+    parser.add_argument('--workspace', default = None, help='folder of the workspace (default: a temporary folder, removed at the end)')
+    parser.add_argument('--output', default = 'bench_results.json', help='where the results are written, as JSON')
+    args = parser.parse_args()
+
+    workspace = os.path.abspath(args.workspace or tempfile.mkdtemp(prefix = 'bench_launcher.'))
+    if os.path.exists(workspace) and os.listdir(workspace):
+        parser.error("the workspace {} is not empty".format(workspace))
+    output_path = os.path.abspath(args.output)
+    results = []
+    try:
+        create_workspace(workspace, args.disk_image_mb << 20)
+        configure_launcher(workspace, os.path.join(workspace, "outputs/"))
+        for stage in args.stages:
+            if stage == 'register':
+                results.append(bench_register(args.repeats, workspace))
+                print(format_summary(results[-1]), flush = True)
+                continue
+            if stage in ['build', 'supervise'] and launch_tests.gem5Run is None:
+                connect_local_artifact_db(os.path.join(workspace, "db.jsonl"))
+                launch_tests.load_artifacts(BENCHMARKS)
+            if stage == 'supervise':
+                results.append(bench_supervise(args.supervise_jobs, args.repeats, workspace, args.supervise_mode,
+                                               args.cores, args.delay, args.check_interval))
+                print(format_summary(results[-1]), flush = True)
+                continue
+            for n_jobs in args.scales:
+                if stage == 'enumerate':
+                    results.append(bench_enumerate(n_jobs, args.repeats))
+                elif stage == 'order':
+                    results.append(bench_order(n_jobs, args.repeats, workspace))
+                else:
+                    results.append(bench_build(n_jobs, args.repeats))
+                print(format_summary(results[-1]), flush = True)
+    finally:
+        os.chdir(os.path.dirname(output_path))
+        if args.workspace is None:
+            shutil.rmtree(workspace, ignore_errors = True)
+
+    report = {
+        'commit': get_repo_commit(),
+        'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': mp.cpu_count()},
+        'args': {key: value for key, value in vars(args).items() if not key in ['workspace', 'output']},
+        'results': results
+    }
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent = 1, sort_keys = True)
+        f.write("\n")
+    print("Wrote {}".format(output_path))
@@ -1,5 +1,9 @@
 from gem5art.artifact.artifact import Artifact
 
+# disk images are huge; don't hash an artifact file again if it hasn't changed
+import artifact_cache
+artifact_cache.install()
+
 # Infomation about this tests repo
 experiments_repo = Artifact.registerArtifact(
     command = 'git clone https://to-be-finalized',
@@ -0,0 +1,137 @@
+import argparse
+import csv
+import sys
+
+import numpy as np
+
+from harvest_stats import ResultsTable, get_results_path, KEY_COLUMNS
+
+# The stats used for comparing simulator throughput. gem5 renamed its global
+# stats, so both the old and the new names are looked up.
+STAT_ALIASES = {
+    'host_seconds': ['host_seconds', 'hostSeconds'],
+    'sim_insts': ['sim_insts', 'simInsts'],
+    'host_mem_usage': ['host_mem_usage', 'hostMemory']
+}
+
+# One-sided 95% critical values of Student's t distribution for 1 to 30
+# degrees of freedom; the normal value is used beyond.
+T_CRITICAL_95 = [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812,
+                 1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734, 1.729, 1.725,
+                 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697]
+T_CRITICAL_95_NORMAL = 1.645
+
+def get_stat(table, stat):
+    for name in STAT_ALIASES[stat]:
+        if name in table.columns:
+            return table.columns[name]
+    return np.full(len(table), np.nan)
+
+# Aggregates the rows (stats dumps) of each run of a results table.
+#
+# return: (config keys, host_seconds, sim_insts, host_mem_usage), one entry
+#         per run; the config key of a run is its benchmark and params
+def aggregate_runs(table):
+    key_columns = [name for name in KEY_COLUMNS if not name in ['campaign', 'dump']]
+    keys = np.array(["/".join(values) for values in zip(*[table.columns[name] for name in key_columns])])
+    configs, inverse = np.unique(keys, return_inverse = True)
+    # host_seconds and sim_insts are reset at each dump, the memory usage is a peak
+    host_seconds = np.bincount(inverse, weights = np.nan_to_num(get_stat(table, 'host_seconds')), minlength = len(configs))
+    sim_insts = np.bincount(inverse, weights = np.nan_to_num(get_stat(table, 'sim_insts')), minlength = len(configs))
+    host_mem_usage = np.full(len(configs), -np.inf)
+    np.maximum.at(host_mem_usage, inverse, np.nan_to_num(get_stat(table, 'host_mem_usage'), nan = -np.inf))
+    return configs, host_seconds, sim_insts, host_mem_usage
+
+def t_critical(degrees_of_freedom):
+    critical = np.full(len(degrees_of_freedom), T_CRITICAL_95_NORMAL)
+    small = (degrees_of_freedom >= 1) & (degrees_of_freedom <= len(T_CRITICAL_95))
+    critical[small] = np.array(T_CRITICAL_95)[degrees_of_freedom[small] - 1]
+    return critical
+
+# Compares the simulator throughput of two campaigns run with different gem5 builds.
+#
+# The runs of the two campaigns are paired by config, and the log-ratio of their host_seconds (new / base) is
+# computed for each pair. For each (cpu, mem_sys) group, a one-sided t-test on the mean log-ratio flags the
+# groups where the new build is significantly slower, by more than `min_slowdown`.
+#
+# return: (per-config rows, per-group rows), as lists of dicts
+def compare(base_table, new_table, min_slowdown = 0.05):
+    base_configs, base_seconds, base_insts, base_mem = aggregate_runs(base_table)
+    new_configs, new_seconds, new_insts, new_mem = aggregate_runs(new_table)
+    configs, base_index, new_index = np.intersect1d(base_configs, new_configs, return_indices = True)
+    base_seconds, base_insts, base_mem = base_seconds[base_index], base_insts[base_index], base_mem[base_index]
+    new_seconds, new_insts, new_mem = new_seconds[new_index], new_insts[new_index], new_mem[new_index]
+
+    valid = (base_seconds > 0) & (new_seconds > 0)
+    configs = configs[valid]
+    base_seconds, base_insts, base_mem = base_seconds[valid], base_insts[valid], base_mem[valid]
+    new_seconds, new_insts, new_mem = new_seconds[valid], new_insts[valid], new_mem[valid]
+    if len(configs) == 0: # no config of one campaign pairs up with a config of the other
+        return [], []
+
+    log_ratio = np.log(new_seconds / base_seconds)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        base_rate = base_insts / base_seconds
+        new_rate = new_insts / new_seconds
+        mem_ratio = new_mem / base_mem
+
+    # the config keys are benchmark/<params in KEY_COLUMNS order>
+    key_columns = ['benchmark'] + [name for name in KEY_COLUMNS if not name in ['campaign', 'benchmark', 'dump']]
+    split_configs = np.array([config.split('/') for config in configs]).reshape(len(configs), len(key_columns))
+    cpus = split_configs[:, key_columns.index('cpu')]
+    mem_systems = split_configs[:, key_columns.index('mem_sys')]
+    groups, group_index = np.unique(np.char.add(np.char.add(cpus, '/'), mem_systems), return_inverse = True)
+
+    n = np.bincount(group_index, minlength = len(groups))
+    mean = np.bincount(group_index, weights = log_ratio, minlength = len(groups)) / np.maximum(n, 1)
+    squares = np.bincount(group_index, weights = (log_ratio - mean[group_index]) ** 2, minlength = len(groups))
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        std = np.sqrt(squares / np.maximum(n - 1, 1))
+        t = mean / (std / np.sqrt(n))
+    t[(n > 1) & (std == 0) & (mean > 0)] = np.inf
+    significant = (n > 1) & (t > t_critical(n - 1)) & (mean > np.log1p(min_slowdown))
+
+    config_rows = []
+    for i, config in enumerate(configs):
+        config_rows.append({'config': config,
+                            'base_host_seconds': base_seconds[i], 'new_host_seconds': new_seconds[i],
+                            'slowdown': np.exp(log_ratio[i]) - 1,
+                            'base_insts_per_host_second': base_rate[i], 'new_insts_per_host_second': new_rate[i],
+                            'host_mem_usage_ratio': mem_ratio[i]})
+    group_rows = []
+    for i, group in enumerate(groups):
+        cpu, mem_sys = group.split('/')
+        group_rows.append({'cpu': cpu, 'mem_sys': mem_sys, 'n_configs': int(n[i]),
+                           'geomean_slowdown': np.exp(mean[i]) - 1, 't': t[i],
+                           'significant_slowdown': bool(significant[i])})
+    return config_rows, group_rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare the simulator throughput of two campaigns (gem5 builds).')
+    parser.add_argument('base', help='RUN_NAME_SUFFIX of the campaign run with the baseline gem5 build')
+    parser.add_argument('new', help='RUN_NAME_SUFFIX of the campaign run with the new gem5 build')
+    parser.add_argument('--min-slowdown', type=float, default = 0.05,
+                        help='smallest slowdown (as a fraction) to report, default 0.05')
+    parser.add_argument('--output', default = None, help='write the per-config comparison to this CSV file')
+    args = parser.parse_args()
+
+    base_table = ResultsTable.load(get_results_path(args.base))
+    new_table = ResultsTable.load(get_results_path(args.new))
+    config_rows, group_rows = compare(base_table, new_table, args.min_slowdown)
+    if not config_rows:
+        print("No config has runs with a nonzero host_seconds in both campaigns", file = sys.stderr)
+
+    if args.output is not None:
+        with open(args.output, 'w', newline = '') as f:
+            writer = csv.DictWriter(f, fieldnames = list(config_rows[0]) if config_rows else ['config'])
+            writer.writeheader()
+            writer.writerows(config_rows)
+
+    print("{:<10} {:<20} {:>8} {:>10} {:>8}".format("cpu", "mem_sys", "configs", "slowdown", "t"))
+    for row in group_rows:
+        print("{:<10} {:<20} {:>8} {:>9.1f}% {:>8.2f} {}".format(
+              row['cpu'], row['mem_sys'], row['n_configs'], 100 * row['geomean_slowdown'], row['t'],
+              "SLOWER" if row['significant_slowdown'] else ""))
+
+    if any(row['significant_slowdown'] for row in group_rows):
+        sys.exit(1)
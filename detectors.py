@@ -0,0 +1,212 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+
+from simout_scanner import PhraseScanner
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len
+
+_libc = None
+
+def get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno = True)
+    return _libc
+
+# Reports which files of a directory have changed since the previous call to `poll()`.
+#
+# The watcher uses inotify, so a call to `poll()` only reads the pending
+# events and never touches the watched files. Where inotify is not available,
+# the watcher falls back to comparing the size and mtime of the files in the
+# directory.
+class DirectoryWatcher:
+    def __init__(self, path):
+        self.path = str(path)
+        self.fd = None
+        self.signatures = {}
+        try:
+            fd = get_libc().inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except AttributeError:
+            fd = -1
+        if fd >= 0:
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            if get_libc().inotify_add_watch(fd, self.path.encode(), mask) >= 0:
+                self.fd = fd
+            else:
+                os.close(fd)
+        # report the files that already exist as changed in the first poll
+        self.initial_files = set(self.list_files())
+
+    def list_files(self):
+        try:
+            return [entry.name for entry in os.scandir(self.path) if entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+    def poll(self):
+        changed = self.initial_files
+        self.initial_files = set()
+        if self.fd is not None:
+            while True:
+                try:
+                    data = os.read(self.fd, 64 * 1024)
+                except BlockingIOError:
+                    break
+                offset = 0
+                while offset < len(data):
+                    _, _, _, length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+                    offset += INOTIFY_EVENT_HEADER.size
+                    changed.add(data[offset:offset + length].rstrip(b'\0').decode())
+                    offset += length
+        else:
+            for name in self.list_files():
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if not self.signatures.get(name, None) == signature:
+                    self.signatures[name] = signature
+                    changed.add(name)
+        return changed
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+# A detector watches the outputs of a run and tells whether the run has
+# stopped making progress.
+#
+# check() is called with the run, the set of files of the output folder that
+# changed since the previous call, and the current run time in seconds; it
+# returns a string describing the failure, or None if the run looks healthy.
+class Detector:
+    def check(self, run, changed_files, run_time):
+        return None
+
+# The simulation has failed to boot the Linux kernel within `timeout` seconds.
+class BootDetector(Detector):
+    def __init__(self, timeout, checking_phrase = "Done booting Linux"):
+        self.timeout = timeout
+        self.checking_phrase = checking_phrase
+        self.scanner = None
+
+    def check(self, run, changed_files, run_time):
+        if self.scanner is None:
+            self.scanner = PhraseScanner(run.outdir / "simout", self.checking_phrase)
+        if self.scanner.found:
+            return None
+        if "simout" in changed_files and self.scanner.scan():
+            return None
+        if run_time >= self.timeout:
+            return "did not boot Linux within {} seconds".format(self.timeout)
+        return None
+
+# None of the `files` of the output folder has changed for `interval` seconds.
+class OutputProgressDetector(Detector):
+    def __init__(self, interval, files = ["simout", "simerr", "stats.txt", "system.pc.com_1.device"]):
+        self.interval = interval
+        self.files = files
+        self.last_progress_time = 0
+
+    def check(self, run, changed_files, run_time):
+        if any(name in changed_files for name in self.files):
+            self.last_progress_time = run_time
+        elif run_time - self.last_progress_time >= self.interval:
+            return "no output for {} seconds".format(self.interval)
+        return None
+
+# No stats have been dumped to stats.txt for `interval` seconds after the
+# kernel has booted, e.g. the workload never reaches its region of interest.
+class StatsDumpDetector(Detector):
+    def __init__(self, interval, checking_phrase = "Done booting Linux"):
+        self.interval = interval
+        self.checking_phrase = checking_phrase
+        self.boot_scanner = None
+        self.boot_time = None
+        self.last_dump_time = None
+
+    def check(self, run, changed_files, run_time):
+        if self.boot_scanner is None:
+            self.boot_scanner = PhraseScanner(run.outdir / "simout", self.checking_phrase)
+        if self.boot_time is None:
+            if "simout" in changed_files and self.boot_scanner.scan():
+                self.boot_time = run_time
+            return None
+        if "stats.txt" in changed_files:
+            self.last_dump_time = run_time
+        last_progress_time = self.last_dump_time if self.last_dump_time is not None else self.boot_time
+        if run_time - last_progress_time >= self.interval:
+            return "no stats dump for {} seconds".format(self.interval)
+        return None
+
+# gem5 has printed its m5 exit message, but is still running `grace` seconds
+# later without any new output.
+class ExitMarkerDetector(Detector):
+    def __init__(self, grace, checking_phrase = "because m5_exit instruction encountered"):
+        self.grace = grace
+        self.checking_phrase = checking_phrase
+        self.scanner = None
+        self.exit_time = None
+
+    def check(self, run, changed_files, run_time):
+        if self.scanner is None:
+            self.scanner = PhraseScanner(run.outdir / "simout", self.checking_phrase)
+        if "simout" in changed_files:
+            if self.exit_time is not None or self.scanner.scan():
+                self.exit_time = run_time
+        if self.exit_time is not None and run_time - self.exit_time >= self.grace:
+            return "still running {} seconds after m5 exit".format(self.grace)
+        return None
+
+# Combines the detectors of a run into a gem5art `check_failure` function.
+# The run has failed as soon as one of the detectors reports a failure; the
+# failure is kept in `reason`.
+class DetectorSet:
+    def __init__(self, detectors):
+        self.detectors = detectors
+        self.watcher = None
+        self.reason = None
+
+    def __call__(self, run):
+        if self.watcher is None:
+            if not os.path.isdir(run.outdir): # gem5 has not created its output folder yet
+                return False
+            self.watcher = DirectoryWatcher(run.outdir)
+        changed_files = self.watcher.poll()
+        run_time = run.current_time - run.start_time
+        for detector in self.detectors:
+            reason = detector.check(run, changed_files, run_time)
+            if reason is not None:
+                self.reason = "{}: {}".format(type(detector).__name__, reason)
+                return True
+        return False
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.close()
+
+# The detector set of each run, by output folder, so that the launcher can
+# get the failure reason and release the watcher once the run is over.
+_detector_sets = {}
+
+def register_detector_set(outdir, detectors):
+    detector_set = DetectorSet(detectors)
+    _detector_sets[os.path.normpath(outdir)] = detector_set
+    return detector_set
+
+def pop_detector_set(outdir):
+    detector_set = _detector_sets.pop(os.path.normpath(outdir), None)
+    if detector_set is not None:
+        detector_set.close()
+    return detector_set
@@ -0,0 +1,150 @@
+import contextlib
+import fcntl
+import os
+import shutil
+import time
+
+from artifact_cache import md5_file
+
+FICLONE = 0x40049409 # ioctl(2) request cloning a whole file, see ioctl_ficlone(2)
+STAGED_IMAGE_SUFFIX = ".img"
+TMP_SUFFIX = ".tmp"
+
+# Copies `src` to `dst`, as a reflink (sharing the blocks of `src`) where the
+# filesystem supports it, i.e. when both files are on the same btrfs/XFS
+# filesystem, and as a plain copy otherwise.
+def clone_or_copy(src, dst):
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        try:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+            return 'reflink'
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+# A cache of disk images on a local disk, shared by all the runs of a host.
+#
+# Each image is staged once, under the name of its artifact hash, and checked
+# against that hash before being used. The runs using an image hold a shared
+# flock on it, so an image is never evicted while a run is using it. Images
+# are evicted in least recently used order (by mtime, which is updated every
+# time a run uses the image) when a new image does not fit in `budget_bytes`.
+#
+# Staging and eviction are serialized by an exclusive flock on the `.lock`
+# file of the folder, so several launchers on the same host can share the
+# folder. A run using an image that is already staged does not take this lock.
+class DiskImageStager:
+    def __init__(self, folder, budget_bytes):
+        self.folder = folder
+        self.budget_bytes = budget_bytes
+        os.makedirs(folder, exist_ok = True)
+
+    def get_staged_path(self, image_hash):
+        return os.path.join(self.folder, image_hash + STAGED_IMAGE_SUFFIX)
+
+    # return: the file object of the staged image, with a shared flock on it, or None if it is not staged
+    def open_staged(self, image_hash):
+        path = self.get_staged_path(image_hash)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+        try:
+            # the image may have been evicted between open() and flock()
+            if not os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+                f.close()
+                return None
+        except FileNotFoundError:
+            f.close()
+            return None
+        os.utime(path)
+        return f
+
+    def list_entries(self):
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(STAGED_IMAGE_SUFFIX) or entry.name.endswith(TMP_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    # Removes the least recently used images that no run is using until `size` more bytes fit in the budget.
+    # Must be called with the folder lock held.
+    #
+    # return: True if `size` bytes fit in the budget
+    def make_room(self, size):
+        entries = self.list_entries()
+        used = 0
+        for _, path, entry_size in entries:
+            if path.endswith(TMP_SUFFIX): # left over by a launcher killed while staging
+                os.remove(path)
+            else:
+                used += entry_size
+        for _, path, entry_size in sorted(entry for entry in entries if entry[1].endswith(STAGED_IMAGE_SUFFIX)):
+            if used + size <= self.budget_bytes:
+                break
+            with open(path, 'rb') as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError: # in use
+                    continue
+                os.remove(path)
+            used -= entry_size
+            print("Evicted {} from the disk image cache".format(os.path.basename(path)))
+        return used + size <= self.budget_bytes
+
+    # Copies the image to the cache and checks it against its hash.
+    #
+    # return: True if the image has been staged
+    def stage(self, path, image_hash):
+        with open(os.path.join(self.folder, ".lock"), 'w') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            staged_path = self.get_staged_path(image_hash)
+            if os.path.exists(staged_path): # staged by another run while waiting for the lock
+                return True
+            try:
+                size = os.path.getsize(path)
+            except OSError as err:
+                print("Not staging {}: {}".format(path, err))
+                return False
+            if not self.make_room(size):
+                print("Not staging {}: it does not fit in the disk image cache".format(path))
+                return False
+            tmp_path = "{}.{}{}".format(staged_path, os.getpid(), TMP_SUFFIX)
+            start_time = time.time()
+            try:
+                method = clone_or_copy(path, tmp_path)
+                staged_hash = md5_file(tmp_path)
+            except OSError as err:
+                print("Not staging {}: {}".format(path, err))
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return False
+            if not staged_hash == image_hash:
+                print("Not staging {}: its hash {} does not match the hash of its artifact {}".format(path, staged_hash, image_hash))
+                os.remove(tmp_path)
+                return False
+            os.rename(tmp_path, staged_path)
+            print("Staged {} ({}, {:.0f} MB in {:.1f} s)".format(path, method, os.path.getsize(staged_path) / 1e6, time.time() - start_time))
+            return True
+
+    # A context in which a run uses the staged copy of the image at `path`,
+    # staging it first if needed. Falls back to `path` if the image cannot be
+    # staged.
+    #
+    # image_hash: the hash of the disk image artifact.
+    @contextlib.contextmanager
+    def use(self, path, image_hash):
+        f = self.open_staged(image_hash)
+        if f is None and self.stage(path, image_hash):
+            f = self.open_staged(image_hash)
+        if f is None:
+            yield path
+            return
+        with f:
+            yield self.get_staged_path(image_hash)
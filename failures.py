@@ -0,0 +1,83 @@
+import collections
+import json
+import os
+import re
+
+import run_archive
+
+# The classes of failed runs.
+TRANSIENT = 'transient' # caused by the host or the infrastructure; the run may succeed if retried
+TIMEOUT = 'timeout' # killed by gem5art's timeout or by a stall detector
+DETERMINISTIC = 'deterministic' # gem5 or the workload failed; retrying would fail again
+
+# Messages of failures caused by the host or by the infrastructure, looked up
+# in the exception raised by gem5art and in the tails of simout and simerr.
+TRANSIENT_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r'KVM.*(busy|failed to (create|open))', # KVM busy / no KVM available
+    r'/dev/kvm',
+    r'Device or resource busy',
+    r'Resource temporarily unavailable',
+    r'Cannot allocate memory',
+    r'Stale file handle', # NFS hiccups
+    r'Input/output error',
+    r'ServerSelectionTimeoutError|AutoReconnect|NetworkTimeout', # gem5art database timeouts
+    r'Connection (refused|reset|timed out)',
+    r'BrokenPipeError'
+]]
+
+TIMEOUT_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r'time(d)? ?out'
+]]
+
+TAIL_SIZE = 64 * 1024
+
+# return: the last `size` bytes of an output file of a run as text, or '' if the file does not exist;
+#         the file is read from the archive of the run if the run has been packed
+def read_tail(path, size = TAIL_SIZE):
+    try:
+        with run_archive.open_output(os.path.dirname(path), os.path.basename(path)) as f:
+            # an archive member is seekable too, but seeking decompresses it from the start, so it is read in one pass
+            if not isinstance(f, run_archive.ArchiveMember):
+                f.seek(max(f.seek(0, os.SEEK_END) - size, 0))
+                return f.read().decode(errors = 'replace')
+            tail = b''
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                tail = (tail + chunk)[-size:]
+            return tail.decode(errors = 'replace')
+    except OSError:
+        return ''
+
+# Classifies a failed run.
+#
+# error: the traceback of the exception raised while running, if any.
+# kill_reason: why gem5art killed the run, if it did.
+# detector_reason: the failure reported by the detectors of the run, if any.
+def classify_failure(error, simout, simerr, kill_reason = None, detector_reason = None):
+    texts = [text for text in [error, simerr, simout] if text]
+    if any(pattern.search(text) for pattern in TRANSIENT_PATTERNS for text in texts):
+        return TRANSIENT
+    if detector_reason:
+        return TIMEOUT
+    if kill_reason and any(pattern.search(kill_reason) for pattern in TIMEOUT_PATTERNS):
+        return TIMEOUT
+    return DETERMINISTIC
+
+# Returns the delay (in seconds) before retrying a job for the `attempt`-th time (starting at 1).
+def get_retry_delay(attempt, backoff):
+    return backoff * 2 ** (attempt - 1)
+
+# Collects the final failures of a campaign and writes a summary per class.
+class FailureSummary:
+    def __init__(self):
+        self.failures = collections.defaultdict(list)
+
+    def add(self, job_id, failure_class, reason, attempts):
+        self.failures[failure_class].append({'job_id': job_id, 'reason': reason, 'attempts': attempts})
+
+    def write(self, path):
+        summary = {failure_class: {'count': len(failures), 'jobs': failures}
+                   for failure_class, failures in sorted(self.failures.items())}
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent = 2)
+        for failure_class, failures in sorted(self.failures.items()):
+            print("{} {} failures".format(len(failures), failure_class))
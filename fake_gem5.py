@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# A stand-in for a gem5 binary, used by bench_launcher.py to measure the
+# overheads of the launcher without simulating anything.
+#
+# It takes the command line of a gem5 full system run,
+#   gem5.opt -re --outdir=<outdir> <run script> <kernel> <disk image> <params>...
+# and writes the outputs a run writes, with realistic contents: `simout`
+# (gem5 banner, the boot and m5_exit markers checked by the detectors),
+# `simerr`, `config.ini` and `stats.txt` (one stats dump per region of
+# interest, with the global stats read by the harvester), then exits after a
+# delay.
+#
+# Environment:
+#   FAKE_GEM5_DELAY: runtime of the run, in seconds (default 0)
+#   FAKE_GEM5_STATS: number of stats per dump (default 1000)
+#   FAKE_GEM5_DUMPS: number of stats dumps (default 2)
+#   FAKE_GEM5_RETURN_CODE: exit code of the run (default 0)
+import os
+import sys
+import time
+
+BEGIN_DUMP = "---------- Begin Simulation Statistics ----------"
+END_DUMP = "---------- End Simulation Statistics   ----------"
+
+def write_stats_dump(f, index, n_stats, delay):
+    sim_insts = 1000000000 * (index + 1)
+    host_seconds = max(delay, 1e-3)
+    f.write("\n" + BEGIN_DUMP + "\n")
+    f.write("{:<60} {:>20.6f}  # Number of seconds simulated (Second)\n".format("simSeconds", 0.5 * (index + 1)))
+    f.write("{:<60} {:>20}  # Number of instructions simulated (Count)\n".format("simInsts", sim_insts))
+    f.write("{:<60} {:>20.2f}  # Real time elapsed on the host (Second)\n".format("hostSeconds", host_seconds))
+    f.write("{:<60} {:>20.0f}  # Simulator instruction rate (inst/s) ((Count/Second))\n".format(
+            "hostInstRate", sim_insts / host_seconds))
+    f.write("{:<60} {:>20}  # Number of bytes of host memory used (Byte)\n".format("hostMemory", 2147483648))
+    for stat in range(n_stats):
+        f.write("{:<60} {:>20}  # Number of events of component {} (Count)\n".format(
+                "system.cpu{}.component{}.numEvents".format(stat % 8, stat), (stat + 1) * (index + 7), stat))
+    f.write("\n" + END_DUMP + "\n")
+
+if __name__ == "__main__":
+    start_time = time.time()
+    args = sys.argv[1:]
+    outdir = next(arg.split("=", 1)[1] for arg in args if arg.startswith("--outdir="))
+    delay = float(os.environ.get("FAKE_GEM5_DELAY", "0"))
+    n_stats = int(os.environ.get("FAKE_GEM5_STATS", "1000"))
+    n_dumps = int(os.environ.get("FAKE_GEM5_DUMPS", "2"))
+    os.makedirs(outdir, exist_ok = True)
+
+    with open(os.path.join(outdir, "simerr"), "w") as f:
+        f.write("warn: The `get_runtime_isa` function is deprecated.\n")
+        f.write("warn: iobus.slave is deprecated. `slave` is now called `cpu_side_ports`\n")
+    with open(os.path.join(outdir, "config.ini"), "w") as f:
+        f.write("[root]\ntype=Root\nchildren=system\nfull_system=true\nsim_quantum=0\ntime_sync_enable=false\n")
+        f.write("\n[system]\ntype=System\nmem_mode=timing\nmem_ranges=0:3221225471\n")
+    with open(os.path.join(outdir, "simout"), "w") as simout:
+        simout.write("gem5 Simulator System.  https://www.gem5.org\n")
+        simout.write("gem5 is copyrighted software; use the --copyright option for details.\n\n")
+        simout.write("gem5 version 21.0.0.0\n")
+        simout.write("command line: {}\n\n".format(" ".join(sys.argv)))
+        simout.write("Global frequency set at 1000000000000 ticks per second\n")
+        simout.write("Running the simulation\n")
+        simout.write("Beginning simulation!\n")
+        simout.flush()
+        time.sleep(delay / 2)
+        simout.write("Done booting Linux\n")
+        simout.flush()
+        with open(os.path.join(outdir, "stats.txt"), "w") as stats:
+            for index in range(n_dumps):
+                write_stats_dump(stats, index, n_stats, delay / (2 * n_dumps))
+                simout.write("Dumped the stats of region {}\n".format(index))
+                simout.flush()
+                time.sleep(delay / (2 * n_dumps))
+        simout.write("Exiting @ tick {} because m5_exit instruction encountered\n".format(
+                     int((time.time() - start_time) * 1e12)))
+    sys.exit(int(os.environ.get("FAKE_GEM5_RETURN_CODE", "0")))
@@ -1,14 +1,39 @@
+from types import SimpleNamespace
+
+# A constraint is a filter together with the params it reads. When the job
+# space is enumerated, a constraint is checked as soon as all of its params
+# are set, so that the combinations it rejects are pruned before the rest of
+# the params are enumerated. A constraint whose params are not all params of
+# a benchmark does not apply to that benchmark.
+def Constraint(fields, predicate):
+    return SimpleNamespace(fields = fields, predicate = predicate)
+
+def check_constraints(constraints, params):
+    for constraint in constraints:
+        if all(field in params for field in constraint.fields) and not constraint.predicate(params):
+            return False
+    return True
+
 # for those combinations that are not being supported
-def universal_filter(params):
-    if 'cpu' in params and 'mem_sys' in params and params['cpu'] == "atomic" and not params['mem_sys'] == "classic":
+def atomic_filter(params):
+    if params['cpu'] == "atomic" and not params['mem_sys'] == "classic":
+        return False
+    return True
+
+def o3_filter(params):
+    #if params['cpu'] == "o3" and not params['num_cpu'] == "1" and params['mem_sys'] == 'classic':
+    if params['cpu'] == 'o3' and params['mem_sys'] == 'classic' and not params['num_cpu'] == '1':
         return False
-    #if 'cpu' in params and 'num_cpu' in params and params['cpu'] == "o3" and not params['num_cpu'] == "1" and 'mem_sys' in params and params['mem_sys'] == 'classic':
-    if 'cpu' in params and params['cpu'] == 'o3':
-        if 'mem_sys' in params and params['mem_sys'] == 'classic':
-            if 'num_cpu' in params and not params['num_cpu'] == '1':
-                return False
     return True
 
+universal_constraints = [
+    Constraint(['cpu', 'mem_sys'], atomic_filter),
+    Constraint(['cpu', 'mem_sys', 'num_cpu'], o3_filter)
+]
+
+def universal_filter(params):
+    return check_constraints(universal_constraints, params)
+
 # https://www.gem5.org/documentation/benchmark_status/#boot-tests
 def boot_filter(params):
     return True
@@ -66,5 +91,53 @@ tests_filters_map = {
     'spec-2017': spec2017_filter
 }
 
+# the params read by each filter in tests_filters_map
+tests_constraints_map = {
+    'boot-exit': [],
+    'npb': [Constraint(['cpu', 'num_cpu'], npb_filter)],
+    'gapbs': [Constraint(['cpu', 'mem_sys'], gapbs_filter)],
+    'parsec': [Constraint(['cpu', 'mem_sys', 'num_cpu', 'size'], parsec_filter)],
+    'parsec-20.04': [Constraint(['cpu', 'mem_sys', 'num_cpu', 'size'], parsec_filter)],
+    'spec-2006': [Constraint(['cpu', 'size'], spec2006_filter)],
+    'spec-2017': [Constraint(['cpu', 'size'], spec2017_filter)]
+}
+
+def get_constraints(name):
+    return tests_constraints_map[name] + universal_constraints
+
 def workload_filter(name, params, custom_filter):
     return custom_filter(name, params) and tests_filters_map[name](params) and universal_filter(params)
+
+# Enumerates the cross product of `domains` as dicts mapping `fields` to values,
+# skipping the combinations rejected by `constraints`.
+#
+# The fields read by the constraints are enumerated first, and each constraint
+# is checked at the depth where its last field is set, so a rejected partial
+# combination is pruned together with all of its extensions. The dicts have
+# their keys in the order of `fields`.
+def constrained_product(fields, domains, constraints):
+    constraints = [constraint for constraint in constraints
+                   if all(field in fields for field in constraint.fields)]
+    constrained_fields = {field for constraint in constraints for field in constraint.fields}
+    order = [field for field in fields if field in constrained_fields] + \
+            [field for field in fields if not field in constrained_fields]
+    field_domains = dict(zip(fields, domains))
+    # the constraints to check once the field at each depth is set
+    depth_constraints = [[] for _ in order]
+    for constraint in constraints:
+        depth = max(order.index(field) for field in constraint.fields)
+        depth_constraints[depth].append(constraint)
+
+    params = {}
+    def enumerate_from(depth):
+        if depth == len(order):
+            yield {field: params[field] for field in fields}
+            return
+        field = order[depth]
+        for value in field_domains[field]:
+            params[field] = value
+            if all(constraint.predicate(params) for constraint in depth_constraints[depth]):
+                yield from enumerate_from(depth + 1)
+        params.pop(field, None)
+
+    return enumerate_from(0)
@@ -0,0 +1,193 @@
+import argparse
+import functools
+import multiprocessing as mp
+import os
+import re
+
+import numpy as np
+
+import run_archive
+from launch_tests import ABS_PATH, OUTPUT_FOLDER, RUN_NAME_SUFFIX, name_outdir_params_map
+
+RESULTS_FOLDER = os.path.join(ABS_PATH, "results/")
+
+# the global simulation and host stats, e.g. sim_seconds, sim_insts, host_seconds, host_inst_rate, host_mem_usage
+DEFAULT_STATS_PATTERNS = [r'^[^.]+$']
+
+BEGIN_DUMP = "---------- Begin Simulation Statistics ----------"
+END_DUMP = "---------- End Simulation Statistics"
+
+# the key columns of the table: the campaign, the benchmark and all the params making up the output folders
+KEY_COLUMNS = ['campaign', 'benchmark'] + \
+    sorted({param for params in name_outdir_params_map.values() for param in params}) + ['dump']
+# the columns identifying the run and the version of its stats.txt, used to only parse new or changed runs
+RUN_COLUMNS = ['run_dir', 'stats_size', 'stats_mtime_ns']
+
+def get_results_path(campaign):
+    return os.path.join(RESULTS_FOLDER, re.sub(r'[^A-Za-z0-9._-]', '_', campaign) + ".npz")
+
+def to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float('nan')
+
+# Parses a gem5 stats.txt file, given as a text file object.
+#
+# return: a list with one dict per stats dump, mapping the name of each stat matching one of `patterns` to its value
+def parse_stats_file(f, patterns):
+    patterns = [re.compile(pattern) for pattern in patterns]
+    dumps = []
+    stats = None
+    for line in f:
+        if line.startswith(BEGIN_DUMP):
+            stats = {}
+        elif line.startswith(END_DUMP):
+            if stats is not None:
+                dumps.append(stats)
+            stats = None
+        elif stats is not None:
+            tokens = line.split()
+            if len(tokens) < 2 or tokens[0].startswith('#'):
+                continue
+            name = tokens[0]
+            if any(pattern.search(name) for pattern in patterns):
+                stats[name] = to_float(tokens[1])
+    return dumps
+
+# Walks the output folders of the runs, OUTPUT_FOLDER/<benchmark>/<param 0>/<param 1>/..., as created by
+# the create_*_fs_run functions in launch_tests.py.
+#
+# return: a list of (benchmark, params, run_dir) of the runs having a stats.txt file, possibly in their archive
+def find_runs(output_folder = OUTPUT_FOLDER):
+    runs = []
+    def walk(benchmark, fields, path, values):
+        if len(values) == len(fields):
+            if run_archive.has_output(path, "stats.txt"):
+                runs.append((benchmark, dict(zip(fields, values)), path))
+            return
+        try:
+            entries = sorted(os.scandir(path), key = lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_dir():
+                walk(benchmark, fields, entry.path, values + [entry.name])
+    for benchmark, fields in name_outdir_params_map.items():
+        walk(benchmark, fields, os.path.join(output_folder, benchmark), [])
+    return runs
+
+# A table of stats stored by columns, one row per (run, stats dump).
+# Each column is a NumPy array: strings for the key and run columns, float64
+# for the stats, with NaN where a stat does not exist in a dump.
+class ResultsTable:
+    def __init__(self, columns = None):
+        self.columns = columns if columns is not None else {}
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def stat_names(self):
+        return [name for name in self.columns if not name in KEY_COLUMNS and not name in RUN_COLUMNS]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle = False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, **self.columns)
+        os.replace(tmp_path, path)
+
+    def select(self, mask):
+        return ResultsTable({name: column[mask] for name, column in self.columns.items()})
+
+    # Appends rows given as dicts; missing stats are NaN, missing keys are ''.
+    def append_rows(self, rows):
+        if not rows:
+            return
+        names = KEY_COLUMNS + RUN_COLUMNS + [name for name in self.columns if not name in KEY_COLUMNS + RUN_COLUMNS]
+        for row in rows:
+            for name in row:
+                if not name in self.columns and not name in names:
+                    names.append(name)
+        n_rows = len(self)
+        columns = {}
+        for name in names:
+            if name in KEY_COLUMNS or name in RUN_COLUMNS:
+                new_values = np.array([str(row.get(name, '')) for row in rows])
+                old_values = self.columns.get(name, np.full(n_rows, '', dtype = new_values.dtype))
+            else:
+                new_values = np.array([row.get(name, np.nan) for row in rows], dtype = np.float64)
+                old_values = self.columns.get(name, np.full(n_rows, np.nan))
+            columns[name] = np.concatenate([old_values, new_values])
+        self.columns = columns
+
+def parse_run(run, patterns):
+    benchmark, params, run_dir = run
+    size, mtime_ns = run_archive.get_output_signature(run_dir, "stats.txt")
+    with run_archive.open_output_text(run_dir, "stats.txt") as f:
+        return run, size, mtime_ns, parse_stats_file(f, patterns)
+
+# Updates the results table of a campaign with the stats of the runs in the output folder.
+#
+# Only the runs that are new, or whose stats.txt has changed since the previous harvest, are parsed; they are
+# parsed in parallel by `workers` processes. The rows of runs that do not exist anymore are removed.
+def harvest(campaign, output_folder = OUTPUT_FOLDER, results_path = None, patterns = DEFAULT_STATS_PATTERNS, workers = mp.cpu_count()):
+    if results_path is None:
+        results_path = get_results_path(campaign)
+    table = ResultsTable.load(results_path) if os.path.exists(results_path) else ResultsTable()
+
+    harvested = {}
+    if len(table):
+        for run_dir, size, mtime_ns in zip(*[table.columns[name] for name in RUN_COLUMNS]):
+            harvested[run_dir] = (size, mtime_ns)
+
+    runs = find_runs(output_folder)
+    run_dirs = set()
+    runs_to_parse = []
+    for run in runs:
+        run_dir = run[2]
+        run_dirs.add(run_dir)
+        size, mtime_ns = run_archive.get_output_signature(run_dir, "stats.txt")
+        if not harvested.get(run_dir, None) == (str(size), str(mtime_ns)):
+            runs_to_parse.append(run)
+
+    # drop the rows of the runs that are parsed again or that do not exist anymore
+    if len(table):
+        parsed_dirs = {run[2] for run in runs_to_parse}
+        table = table.select(np.array([run_dir in run_dirs and not run_dir in parsed_dirs
+                                       for run_dir in table.columns['run_dir']], dtype = bool))
+
+    rows = []
+    with mp.Pool(workers) as pool:
+        for run, size, mtime_ns, dumps in pool.imap_unordered(functools.partial(parse_run, patterns = patterns), runs_to_parse, chunksize = 16):
+            benchmark, params, run_dir = run
+            for dump, stats in enumerate(dumps):
+                row = {'campaign': campaign, 'benchmark': benchmark, 'dump': dump,
+                       'run_dir': run_dir, 'stats_size': size, 'stats_mtime_ns': mtime_ns}
+                row.update(params)
+                row.update(stats)
+                rows.append(row)
+    table.append_rows(rows)
+    table.save(results_path)
+    print("Parsed {} of {} runs, {} rows in {}".format(len(runs_to_parse), len(runs), len(table), results_path))
+    return table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Harvest the stats.txt files of a campaign into a columnar table.')
+    parser.add_argument('--campaign', default = RUN_NAME_SUFFIX,
+                        help='name of the campaign the runs in the output folder belong to')
+    parser.add_argument('--output-folder', default = OUTPUT_FOLDER)
+    parser.add_argument('--results', default = None,
+                        help='path to the .npz table, by default results/<campaign>.npz')
+    parser.add_argument('--stats', action='append', default = None, metavar='REGEX',
+                        help='only harvest the stats whose names match one of the regexes')
+    parser.add_argument('--workers', type=int, default = mp.cpu_count())
+    args = parser.parse_args()
+
+    harvest(args.campaign, args.output_folder, args.results, args.stats or DEFAULT_STATS_PATTERNS, args.workers)
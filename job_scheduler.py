@@ -0,0 +1,248 @@
+import collections
+import heapq
+import itertools
+import os
+import threading
+import time
+
+# Estimated amount of guest memory (in GB) that the run scripts of each
+# benchmark give to the simulated system. gem5 backs the whole guest memory
+# with host memory, so this is the main part of the host memory footprint.
+GUEST_MEMORY_GB = {
+    'boot-exit': 3,
+    'npb': 3,
+    'gapbs': 3,
+    'parsec': 2,
+    'parsec-20.04': 2,
+    'spec-2006': 3,
+    'spec-2017': 3
+}
+
+# Host memory (in GB) used by gem5 itself on top of the guest memory.
+SIMULATOR_BASE_MEMORY_GB = 1
+# Ruby memory systems keep per-cpu caches, directories and message buffers.
+RUBY_MEMORY_PER_CPU_GB = 0.25
+O3_MEMORY_PER_CPU_GB = 0.5
+
+# Returns the host resources needed by one job as a (cores, memory_gb) tuple.
+#
+# A KVM run executes every simulated cpu in its own host thread, so it
+# occupies as many host cores as it has simulated cpus. The other cpu models
+# (atomic, simple, timing, o3) are simulated by a single-threaded gem5 and
+# occupy one host core regardless of the number of simulated cpus.
+def job_cost(name, params):
+    num_cpu = int(params.get('num_cpu', '1'))
+    cpu = params['cpu']
+    mem_sys = params.get('mem_sys', 'classic')
+
+    if cpu == 'kvm':
+        cores = num_cpu
+    else:
+        cores = 1
+
+    memory = GUEST_MEMORY_GB.get(name, 3) + SIMULATOR_BASE_MEMORY_GB
+    if not mem_sys == 'classic':
+        memory += RUBY_MEMORY_PER_CPU_GB * num_cpu
+    if cpu == 'o3':
+        memory += O3_MEMORY_PER_CPU_GB * num_cpu
+    return cores, memory
+
+def get_host_memory_gb():
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 ** 3)
+
+# Dispatches jobs to a multiprocessing pool such that the sum of the costs of
+# the running jobs never exceeds the host core and memory budgets.
+#
+# Jobs are considered in the order they are given. When the job at the head of
+# the queue does not fit in the remaining budget, the following `lookahead`
+# jobs are scanned for one that does (first-fit backfilling), so that small
+# jobs fill the cores left idle by big ones. A job that is larger than the
+# whole budget is clamped to the budget, i.e. it runs alone on the host.
+# A job can be put back in the queue with `requeue()`, e.g. to retry it after
+# a delay.
+#
+# pool: a multiprocessing pool with at least `cores` processes.
+# worker: the function applied to each job in the pool.
+# cores, memory_gb: the host budgets.
+# cost_function: maps (name, params) to a (cores, memory_gb) tuple.
+# on_dispatch: called in the main process with the job when a job is dispatched.
+# on_done: called in the main process with (job, result) when a job finishes.
+class JobScheduler:
+    def __init__(self, pool, worker, cores, memory_gb, cost_function = job_cost, lookahead = 64, on_dispatch = None, on_done = None):
+        self.pool = pool
+        self.worker = worker
+        self.cores = cores
+        self.memory_gb = memory_gb
+        self.cost_function = cost_function
+        self.lookahead = lookahead
+        self.on_dispatch = on_dispatch
+        self.on_done = on_done
+
+        self.used_cores = 0
+        self.used_memory_gb = 0
+        self.running = 0
+        self.delayed = [] # heap of (ready time, sequence number, job)
+        self.sequence = itertools.count()
+        self.requeued = set()
+        self.errors = []
+        self.stopping = False
+        self.job_queue = None # the live queue of `serve()`
+        self.condition = threading.Condition()
+
+    def get_cost(self, job):
+        name, params = job
+        cores, memory_gb = self.cost_function(name, params)
+        return min(cores, self.cores), min(memory_gb, self.memory_gb)
+
+    def fits(self, cost):
+        cores, memory_gb = cost
+        return self.used_cores + cores <= self.cores and self.used_memory_gb + memory_gb <= self.memory_gb
+
+    # The jobs are pulled from `jobs` by a feeder thread, outside the condition, at most `lookahead` ahead of the
+    # dispatched jobs, so that an iterator doing I/O or waiting for jobs (e.g. WorkQueue.claim_jobs) never blocks
+    # the dispatching of the jobs already pulled, nor the callbacks of the finished ones.
+    def run(self, jobs):
+        self.queue = collections.deque() # (job, cost) of the pulled jobs that have not been dispatched
+        self.pulled = collections.deque() # jobs pulled by the feeder, not yet seen by the dispatching loop
+        self.exhausted = False
+        feeder = threading.Thread(target = self.feed, args = (iter(jobs),), daemon = True)
+        feeder.start()
+        queue = self.queue
+        with self.condition:
+            while True:
+                while self.pulled:
+                    job = self.pulled.popleft()
+                    queue.append((job, self.get_cost(job)))
+                now = time.time()
+                while self.delayed and self.delayed[0][0] <= now:
+                    _, _, job = heapq.heappop(self.delayed)
+                    self.requeued.discard(job)
+                    queue.appendleft((job, self.get_cost(job)))
+                if self.exhausted and not queue and self.running == 0 and not self.delayed:
+                    break
+
+                dispatched = False
+                for index, (job, cost) in enumerate(queue):
+                    if self.fits(cost):
+                        del queue[index]
+                        self.dispatch(job, cost)
+                        dispatched = True
+                        break
+                if dispatched:
+                    self.condition.notify_all() # the feeder may pull another job
+                elif self.delayed:
+                    self.condition.wait(max(self.delayed[0][0] - now, 0))
+                else:
+                    self.condition.wait()
+        feeder.join()
+
+        if self.errors:
+            raise self.errors[0]
+
+    # Pulls the jobs of `run()`, keeping at most `lookahead` pulled jobs waiting to be dispatched.
+    def feed(self, jobs):
+        try:
+            while True:
+                with self.condition:
+                    while len(self.pulled) + len(self.queue) >= self.lookahead:
+                        self.condition.wait()
+                job = next(jobs, None)
+                if job is None:
+                    break
+                with self.condition:
+                    self.pulled.append(job)
+                    self.condition.notify_all()
+        except Exception as err:
+            with self.condition:
+                self.errors.append(err)
+        finally:
+            with self.condition:
+                self.exhausted = True
+                self.condition.notify_all()
+
+    # Dispatches the jobs of a live queue (see launcher_daemon.py), to which jobs can be
+    # submitted, reprioritized and cancelled while the scheduler runs, until
+    # `stop()` is called and the running jobs have finished. The queue shares
+    # the condition of the scheduler.
+    def serve(self, job_queue):
+        self.job_queue = job_queue
+        retries = collections.deque()
+        with self.condition:
+            while True:
+                now = time.time()
+                while self.delayed and self.delayed[0][0] <= now:
+                    _, _, job = heapq.heappop(self.delayed)
+                    self.requeued.discard(job)
+                    retries.append(job)
+                if self.stopping:
+                    if self.running == 0:
+                        break
+                    self.condition.wait()
+                    continue
+
+                dispatched = False
+                for job in list(retries) + job_queue.candidates(self.lookahead):
+                    cost = self.get_cost(job)
+                    if self.fits(cost):
+                        if job in retries:
+                            retries.remove(job)
+                        else:
+                            job_queue.take(job)
+                        self.dispatch(job, cost)
+                        dispatched = True
+                        break
+                if not dispatched:
+                    if self.delayed:
+                        self.condition.wait(max(self.delayed[0][0] - now, 0))
+                    else:
+                        self.condition.wait()
+
+        if self.errors:
+            raise self.errors[0]
+
+    # Stops `serve()` from dispatching jobs; it returns once the running jobs have finished.
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+
+    # Puts a job back in the queue, to be dispatched again after `delay` seconds.
+    def requeue(self, job, delay = 0):
+        with self.condition:
+            self.requeued.add(job)
+            heapq.heappush(self.delayed, (time.time() + delay, next(self.sequence), job))
+            self.condition.notify_all()
+
+    def dispatch(self, job, cost):
+        cores, memory_gb = cost
+        self.used_cores += cores
+        self.used_memory_gb += memory_gb
+        self.running += 1
+        if self.on_dispatch is not None:
+            self.on_dispatch(job)
+        self.pool.apply_async(self.worker, (job,),
+                              callback = lambda result: self.release(job, cost, result),
+                              error_callback = lambda err: self.release(job, cost, None, err))
+
+    # The resources of the job are given back first, so that other jobs can be dispatched while `on_done` runs;
+    # the job only stops counting as running once `on_done` has had the chance to requeue it.
+    def release(self, job, cost, result, err = None):
+        with self.condition:
+            cores, memory_gb = cost
+            self.used_cores -= cores
+            self.used_memory_gb -= memory_gb
+            if err is not None:
+                self.errors.append(err)
+            self.condition.notify_all()
+        try:
+            if self.on_done is not None and err is None:
+                self.on_done(job, result)
+        except Exception as on_done_err: # the job still has to stop counting as running, or the scheduler never returns
+            err = on_done_err
+            with self.condition:
+                self.errors.append(err)
+        with self.condition:
+            self.running -= 1
+            if not job in self.requeued and self.job_queue is not None:
+                self.job_queue.finish(job)
+            self.condition.notify_all()
@@ -0,0 +1,96 @@
+import sys
+
+# A stable identifier of a job, e.g.
+#   npb:cpu=kvm,kernel=4.19.83,mem_sys=classic,num_cpu=8,workload=is.A.x
+# The params are sorted so that the identifier does not depend on the order
+# in which a job iterator builds the params dict.
+def job_id(name, params):
+    return "{}:{}".format(name, ",".join("{}={}".format(key, params[key]) for key in sorted(params)))
+
+# The param names of the jobs of each benchmark, in the order of the first job
+# built with them, by (benchmark, set of param names).
+_interned_keys = {}
+# (benchmark, param names in some order) -> (interned param names, positions
+# of the interned names in that order, or None if it is the same order)
+_key_orders = {}
+# The param names registered for each benchmark with `register_params()`.
+_registered_keys = {}
+
+def get_key_order(name, keys):
+    order = _key_orders.get((name, keys))
+    if order is None:
+        interned_keys = _interned_keys.setdefault((name, frozenset(keys)), tuple(sys.intern(key) for key in keys))
+        positions = None if interned_keys == keys else tuple(keys.index(key) for key in interned_keys)
+        order = _key_orders[(name, keys)] = (interned_keys, positions)
+    return order
+
+# Registers the param names of the jobs of a benchmark, in the order in which
+# they are printed. Every process running the jobs (e.g. the workers of a
+# pool) must register the same param names, usually when importing the module
+# enumerating the jobs.
+#
+# return: the registered param names
+def register_params(name, keys):
+    keys = tuple(sys.intern(key) for key in keys)
+    keys = _interned_keys.setdefault((name, frozenset(keys)), keys)
+    _registered_keys[name] = keys
+    return keys
+
+# A compact, hashable description of one job: a benchmark name and its params.
+#
+# The param names of all the jobs of a benchmark are shared in one tuple, and
+# the names and values are interned, so a job only costs a few small objects.
+# The params keep the order of the first job of the benchmark (or the order
+# registered with `register_params()`), so two JobSpecs of the same job are
+# equal whatever the order of the params they were built from.
+#
+# A JobSpec of a benchmark whose params have been registered pickles as its
+# name and param values only, which keeps the messages sent to the workers
+# smaller than the params dict; the other JobSpecs also carry their param
+# names.
+#
+# For compatibility with the (name, params) tuples used elsewhere, a JobSpec
+# unpacks as `name, params = job`.
+class JobSpec:
+    __slots__ = ('name', 'keys', 'values')
+
+    def __init__(self, name, keys, values):
+        self.name = sys.intern(name)
+        self.keys, positions = get_key_order(self.name, tuple(keys))
+        values = tuple(values)
+        if positions is not None:
+            values = [values[position] for position in positions]
+        self.values = tuple(sys.intern(value) for value in values)
+
+    @classmethod
+    def from_params(cls, name, params):
+        return cls(name, params.keys(), params.values())
+
+    @property
+    def params(self):
+        return dict(zip(self.keys, self.values))
+
+    @property
+    def id(self):
+        return job_id(self.name, self.params)
+
+    def __iter__(self):
+        return iter((self.name, self.params))
+
+    def __eq__(self, other):
+        return isinstance(other, JobSpec) and (self.name, self.keys, self.values) == (other.name, other.keys, other.values)
+
+    def __hash__(self):
+        return hash((self.name, self.keys, self.values))
+
+    def __reduce__(self):
+        if _registered_keys.get(self.name, None) is self.keys:
+            return (load_registered_job, (self.name, self.values))
+        return (JobSpec, (self.name, self.keys, self.values))
+
+    def __repr__(self):
+        return "JobSpec({!r}, {!r})".format(self.name, self.params)
+
+# Unpickles a JobSpec of a benchmark whose params have been registered.
+def load_registered_job(name, values):
+    return JobSpec(name, _registered_keys[name], values)
@@ -1,17 +1,36 @@
-from itertools import product as cross_product
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
 import multiprocessing as mp
 import os
 import pathlib
+import signal
 import sys
+import threading
+import time
 import traceback
 
-from common_artifacts import *
-from tests_artifacts import *
 from filter_logic import *
 import input_space
-
-from gem5art.artifact.artifact import Artifact
-from gem5art.run import gem5Run
+from job_scheduler import JobScheduler, job_cost, get_host_memory_gb
+from runtime_model import RuntimeModel, longest_expected_first
+from simout_scanner import get_scanner, forget_scanners
+from detectors import BootDetector, OutputProgressDetector, StatsDumpDetector, ExitMarkerDetector, register_detector_set, pop_detector_set
+from jobs import job_id, JobSpec, register_params
+import ledger
+from sharding import parse_shard, shard_jobs
+import artifact_cache
+from telemetry import RunTelemetry, ProcessTelemetry
+from progress import CampaignProgress
+import failures
+from disk_staging import DiskImageStager
+import run_archive
+import result_cache
+from supervisor import RunSupervisor, supervise_run
+from launcher_daemon import JobQueue, DaemonServer, is_daemon_listening
+from work_queue import WorkQueue, LEASE_TIME
 
 import argparse
 
@@ -23,86 +42,231 @@ GEM5_FOLDER = os.path.join(ABS_PATH, "gem5/")
 GEM5_RESOURCES_FOLDER = os.path.join(ABS_PATH, "gem5-resources/")
 DISK_IMAGES_FOLDER = os.path.join(ABS_PATH, "disk-images/")
 LINUX_KERNELS_FOLDER = os.path.join(ABS_PATH, "linux-kernels/")
+PACKER_PATH = os.path.join(ABS_PATH, "packer")
 RUN_NAME_SUFFIX = "launched:04/07/2021;gem5art-status;v21.0;lavandula-multifida;patch-0"
+RUNTIME_HISTORY_FILE = os.path.join(ABS_PATH, "runtime_history.jsonl")
+LEDGER_FILE = os.path.join(ABS_PATH, "ledger.jsonl")
+STATUS_FILE = os.path.join(ABS_PATH, "status.txt")
+FAILURE_SUMMARY_FILE = os.path.join(ABS_PATH, "failure_summary.json")
+RESULT_INDEX_FILE = os.path.join(ABS_PATH, "result_index.jsonl")
 
 BOOTING_TIMEOUT = 10 * 60 # 10 minutes; booting Linux kernel w/ KVM is fast
 GEM5RUN_CHECK_FAILURE_INTERVAL = 5 # 5 seconds
+PACKING_WORKERS = 4 # number of output folders packed at the same time with --pack-outputs
+QUEUE_LOOKAHEAD = 4 # number of jobs claimed from the work queue ahead of the free resources with --queue
 
 os.makedirs(ERR_FOLDER, exist_ok=True)
 
+# gem5art and the artifacts are only imported when runs are about to be created, so that enumerating and filtering
+# the jobs (e.g. with --test) neither imports gem5art nor needs its database.
+gem5Run = None
+loaded_artifacts = set()
+# the artifacts of each loaded benchmark
+name_artifacts_map = {}
+# with --supervisor, the runs are created from the threads of the executor of the supervisor
+artifacts_lock = threading.Lock()
+
+# Imports gem5art and the common artifacts (gem5, m5, kernels), and the disk image artifacts of the benchmarks in `names`
+# that have not been loaded yet.
+# Since disk image artifacts are huge, here we lazily import artifacts as needed.
+def load_artifacts(names):
+    global gem5Run, experiments_repo, gem5_repo, gem5_binaries, linux_binaries
+    global boot_exit_artifacts, npb_artifacts, gapbs_artifacts, parsec_artifacts, parsec_20_04_artifacts
+    global spec_2006_artifacts, spec_2017_artifacts
+
+    with artifacts_lock:
+        names = [name for name in names if not name in loaded_artifacts]
+        # hash the new artifact files all at once rather than one by one while registering them
+        paths = [get_disk_image_path(name) for name in names]
+        if gem5Run is None:
+            paths += get_common_artifact_paths()
+        artifact_cache.prefetch_hashes(paths)
+
+        if gem5Run is None:
+            from gem5art.run import gem5Run
+            from common_artifacts import experiments_repo, gem5_repo, gem5_binaries, linux_binaries
+
+        if not names:
+            return
+
+        import tests_artifacts
+        for name in names:
+            print("Loading {} artifacts".format(name))
+            if name == "boot-exit":
+                boot_exit_artifacts = artifacts = tests_artifacts.get_boot_exit_artifacts()
+            elif name == "npb":
+                npb_artifacts = artifacts = tests_artifacts.get_npb_artifacts()
+            elif name == "gapbs":
+                gapbs_artifacts = artifacts = tests_artifacts.get_gapbs_artifacts()
+            elif name == "parsec":
+                parsec_artifacts = artifacts = tests_artifacts.get_parsec_artifacts()
+            elif name == "parsec-20.04":
+                parsec_20_04_artifacts = artifacts = tests_artifacts.get_parsec_20_04_artifacts()
+            elif name == "spec-2006":
+                spec_2006_artifacts = artifacts = tests_artifacts.get_spec_2006_artifacts()
+            elif name == "spec-2017":
+                spec_2017_artifacts = artifacts = tests_artifacts.get_spec_2017_artifacts()
+            else:
+                raise ValueError("Unknown fs run name: {}".format(name))
+            name_artifacts_map[name] = artifacts
+            loaded_artifacts.add(name)
+
+# return: the files of the artifacts registered when importing common_artifacts.py and tests_artifacts.py, i.e. m5, the
+#         gem5 binaries and the kernels used by the input space (see input_space.py), and packer
+def get_common_artifact_paths():
+    input_params = input_space.name_params_map.values()
+    mem_systems = {mem_sys for params in input_params for mem_sys in getattr(params, 'mem_sys', [])}
+    kernels = {kernel for params in input_params for kernel in params.kernels}
+    return ([os.path.join(GEM5_FOLDER, "util/m5/build/x86/out/m5"), PACKER_PATH] +
+            [get_gem5_binary_path(mem_sys) for mem_sys in sorted(mem_systems)] +
+            [os.path.join(LINUX_KERNELS_FOLDER, 'vmlinux'+'-'+kernel) for kernel in sorted(kernels)])
+
 def lists_to_dict(keys, vals):
     return dict(zip(keys, vals))
 
 def to_abs_path(path): # return the absoblute path of a relative path, assuming the relative path to be relative to the folder containing this script
     return os.path.join(ABS_PATH, path)
 
-def get_boot_exit_jobs_iterator():
+# the params of the jobs of each benchmark, in the order in which they are enumerated and printed
+name_job_params_map = {
+    'boot-exit': ['kernel', 'cpu', 'mem_sys', 'num_cpu', 'boot_type'],
+    'npb': ['kernel', 'cpu', 'mem_sys', 'num_cpu', 'workload'],
+    'gapbs': ['kernel', 'cpu', 'num_cpu', 'mem_sys', 'workload', 'synthetic', 'n_nodes'],
+    'parsec': ['kernel', 'cpu', 'mem_sys', 'num_cpu', 'workload', 'size'],
+    'parsec-20.04': ['kernel', 'cpu', 'mem_sys', 'num_cpu', 'workload', 'size'],
+    'spec-2006': ['kernel', 'cpu', 'mem_sys', 'workload', 'size'],
+    'spec-2017': ['kernel', 'cpu', 'workload', 'size']
+}
+for name, keys in name_job_params_map.items():
+    register_params(name, keys)
+
+def get_boot_exit_jobs_iterator(custom_constraints = []):
     name = 'boot-exit'
     params = input_space.name_params_map[name]
-    for p in cross_product(params.kernels, params.cpu_types, params.mem_sys, params.num_cpus, params.boot_types):
-        kwargs = lists_to_dict(['kernel', 'cpu', 'mem_sys', 'num_cpu', 'boot_type'], p)
-        yield kwargs
+    return constrained_product(name_job_params_map[name],
+                               [params.kernels, params.cpu_types, params.mem_sys, params.num_cpus, params.boot_types],
+                               get_constraints(name) + custom_constraints)
 
-def get_npb_jobs_iterator():
+def get_npb_jobs_iterator(custom_constraints = []):
     name = 'npb'
     params = input_space.name_params_map[name]
-    for p in cross_product(params.kernels, params.cpu_types, params.mem_sys, params.num_cpus, params.workloads):
-        kwargs = lists_to_dict(['kernel', 'cpu', 'mem_sys', 'num_cpu', 'workload'], p)
-        yield kwargs
+    return constrained_product(name_job_params_map[name],
+                               [params.kernels, params.cpu_types, params.mem_sys, params.num_cpus, params.workloads],
+                               get_constraints(name) + custom_constraints)
 
-def get_gapbs_jobs_iterator():
+def get_gapbs_jobs_iterator(custom_constraints = []):
     name = 'gapbs'
     params = input_space.name_params_map[name]
-    for p in cross_product(params.kernels, params.cpu_types, params.num_cpus, params.mem_sys, params.workloads, params.synthetic, params.n_nodes):
-        kwargs = lists_to_dict(['kernel', 'cpu', 'num_cpu', 'mem_sys', 'workload', 'synthetic', 'n_nodes'], p)
-        yield kwargs
+    return constrained_product(name_job_params_map[name],
+                               [params.kernels, params.cpu_types, params.num_cpus, params.mem_sys, params.workloads, params.synthetic, params.n_nodes],
+                               get_constraints(name) + custom_constraints)
 
-def get_parsec_jobs_iterator():
+def get_parsec_jobs_iterator(custom_constraints = []):
     name = 'parsec'
     params = input_space.name_params_map[name]
-    for p in cross_product(params.kernels, params.cpu_types, params.mem_sys, params.num_cpus, params.workloads, params.sizes):
-        kwargs = lists_to_dict(['kernel', 'cpu', 'mem_sys', 'num_cpu', 'workload', 'size'], p)
-        yield kwargs
+    return constrained_product(name_job_params_map[name],
+                               [params.kernels, params.cpu_types, params.mem_sys, params.num_cpus, params.workloads, params.sizes],
+                               get_constraints(name) + custom_constraints)
 
-def get_parsec_20_04_jobs_iterator():
+def get_parsec_20_04_jobs_iterator(custom_constraints = []):
     name = 'parsec-20.04'
     params = input_space.name_params_map[name]
-    for p in cross_product(params.kernels, params.cpu_types, params.mem_sys, params.num_cpus, params.workloads, params.sizes):
-        kwargs = lists_to_dict(['kernel', 'cpu', 'mem_sys', 'num_cpu', 'workload', 'size'], p)
-        yield kwargs
+    return constrained_product(name_job_params_map[name],
+                               [params.kernels, params.cpu_types, params.mem_sys, params.num_cpus, params.workloads, params.sizes],
+                               get_constraints(name) + custom_constraints)
 
-def get_spec_2006_jobs_iterator():
+def get_spec_2006_jobs_iterator(custom_constraints = []):
     name = 'spec-2006'
     params = input_space.name_params_map[name]
-    for p in cross_product(params.kernels, params.cpu_types, params.mem_sys, params.workloads, params.sizes):
-        kwargs = lists_to_dict(['kernel', 'cpu', 'mem_sys', 'workload', 'size'], p)
-        yield kwargs
+    return constrained_product(name_job_params_map[name],
+                               [params.kernels, params.cpu_types, params.mem_sys, params.workloads, params.sizes],
+                               get_constraints(name) + custom_constraints)
 
-def get_spec_2017_jobs_iterator():
+def get_spec_2017_jobs_iterator(custom_constraints = []):
     name = 'spec-2017'
     params = input_space.name_params_map[name]
-    for p in cross_product(params.kernels, params.cpu_types, params.workloads, params.sizes):
-        kwargs = lists_to_dict(['kernel', 'cpu', 'workload', 'size'], p)
-        yield kwargs
-
-def get_jobs_iterator(custom_filter = lambda name, params: True):
-    iterators = [get_boot_exit_jobs_iterator(),
-                 get_npb_jobs_iterator(),
-                 get_gapbs_jobs_iterator(),
-                 get_parsec_jobs_iterator(),
-                 #get_parsec_20_04_jobs_iterator(),
-                 get_spec_2006_jobs_iterator(),
-                 get_spec_2017_jobs_iterator()]
+    return constrained_product(name_job_params_map[name],
+                               [params.kernels, params.cpu_types, params.workloads, params.sizes],
+                               get_constraints(name) + custom_constraints)
+
+# The benchmark and universal filters are applied while the job space is enumerated (see filter_logic.py).
+# custom_constraints: constraints on the params (e.g. only KVM runs), also applied while enumerating.
+# custom_filter: a function of (name, params) applied to the enumerated jobs.
+def get_jobs_iterator(custom_filter = lambda name, params: True, custom_constraints = []):
+    iterators = [get_boot_exit_jobs_iterator(custom_constraints),
+                 get_npb_jobs_iterator(custom_constraints),
+                 get_gapbs_jobs_iterator(custom_constraints),
+                 get_parsec_jobs_iterator(custom_constraints),
+                 #get_parsec_20_04_jobs_iterator(custom_constraints),
+                 get_spec_2006_jobs_iterator(custom_constraints),
+                 get_spec_2017_jobs_iterator(custom_constraints)]
     #names = ['boot-exit', 'npb', 'gapbs', 'parsec', 'parsec-20.04', 'spec-2006', 'spec-2017']
     names = ['boot-exit', 'npb', 'gapbs', 'parsec', 'spec-2006', 'spec-2017']
     for name, iterator in zip(names, iterators):
-        while True:
-            try:
-                kwargs = next(iterator)
-                if workload_filter(name, kwargs, custom_filter):
-                    yield (name, kwargs)
-            except StopIteration:
-                break
+        for kwargs in iterator:
+            if custom_filter(name, kwargs):
+                yield JobSpec.from_params(name, kwargs)
+
+# the params that make up the output folder of a run of each benchmark, in order
+name_outdir_params_map = {
+    'boot-exit': ['kernel', 'cpu', 'num_cpu', 'mem_sys', 'boot_type'],
+    'npb': ['kernel', 'cpu', 'num_cpu', 'mem_sys', 'workload'],
+    'gapbs': ['kernel', 'cpu', 'num_cpu', 'mem_sys', 'workload', 'synthetic', 'n_nodes'],
+    'parsec': ['kernel', 'cpu', 'num_cpu', 'mem_sys', 'workload', 'size'],
+    'parsec-20.04': ['kernel', 'cpu', 'num_cpu', 'mem_sys', 'workload', 'size'],
+    'spec-2006': ['kernel', 'cpu', 'mem_sys', 'workload', 'size'],
+    'spec-2017': ['kernel', 'cpu', 'workload', 'size']
+}
+
+# return: the output folder of the run, i.e. OUTPUT_FOLDER/<name>/<param 0>/<param 1>/.../
+def get_outdir(name, params):
+    return os.path.join(OUTPUT_FOLDER, name, *[params[param] for param in name_outdir_params_map[name]], '')
+
+# the disk image used by each benchmark, in DISK_IMAGES_FOLDER
+name_disk_image_map = {
+    'boot-exit': 'boot-exit.img',
+    'npb': 'npb.img',
+    'gapbs': 'gapbs.img',
+    'parsec': 'parsec.img',
+    'parsec-20.04': 'parsec-20.04',
+    'spec-2006': 'spec-2006',
+    'spec-2017': 'spec-2017'
+}
+
+def get_disk_image_path(name):
+    return os.path.join(DISK_IMAGES_FOLDER, name_disk_image_map[name])
+
+# The stager of the disk images on the local disk; set by the launcher with --stage-disk-images before the runs are
+# created. The disk image of the run of a worker is staged when the run is dispatched to the worker.
+disk_image_stager = None
+staged_disk_images = {}
+staged_disk_image_users = collections.Counter()
+staged_disk_images_lock = threading.Lock()
+
+# return: the path of the disk image used by the runs of the benchmark, i.e. its staged copy if it has been staged
+def get_run_disk_image_path(name):
+    with staged_disk_images_lock:
+        return staged_disk_images.get(name, get_disk_image_path(name))
+
+# A context in which the runs of the worker use the staged copy of the disk image of the job.
+@contextlib.contextmanager
+def stage_disk_image(name, params):
+    if disk_image_stager is None:
+        yield
+        return
+    load_artifacts([name])
+    with disk_image_stager.use(get_disk_image_path(name), name_artifacts_map[name].disk_image.hash) as path:
+        # with --supervisor, the runs of a benchmark share the launcher process, and are staged from its threads
+        with staged_disk_images_lock:
+            staged_disk_images[name] = path
+            staged_disk_image_users[name] += 1
+        try:
+            yield
+        finally:
+            with staged_disk_images_lock:
+                staged_disk_image_users[name] -= 1
+                if staged_disk_image_users[name] == 0:
+                    del staged_disk_images[name]
 
 def get_gem5_binary_path(mem_sys):
     if mem_sys == "classic":
@@ -112,33 +276,80 @@ def get_gem5_binary_path(mem_sys):
 
 # This function is to check whether the simulation has failed to boot Linux kernel within a specified amount of time.
 # This function will search for `checking_phrase` in the `simout` file of the simulation corresponding to gem5run_object.
-# Because this function is expensive time-wise / resources-wise, the check will only perform checking for failure when time in this range [timeout, timeout + 5 * gem5art_check_failure_interval)
+# The search is incremental: every call only reads the part of `simout` written since the previous call, and once
+# `checking_phrase` has been found, `simout` is not read anymore. This makes it cheap to call this function for the whole run.
 #
 # gem5run_object: the gem5run to check.
 # timeout: , in seconds.
 # gem5art_check_failure_interval: how frequently gem5art calls this function.
 # checking_phrase: if this phrase exists in simout, the simulation has done booted Linux kernel.
 #
-# return: True if `checking_phrase` does not appear in `simout` file if the runtime is within [timeout, timeout + 5 * gem5art_check_failure_interval)
+# return: True if `checking_phrase` does not appear in `simout` file and the runtime is at least `timeout`
 #         False otherwise
 def linux_booting_check_failure(gem5run_object, timeout = BOOTING_TIMEOUT, gem5art_check_failure_interval = GEM5RUN_CHECK_FAILURE_INTERVAL, checking_phrase = "Done booting Linux"):
-    run_time = gem5run_object.current_time - gem5run_object.start_time
-    if not (run_time >= timeout and run_time < timeout + 5 * gem5art_check_failure_interval):
+    scanner = get_scanner(gem5run_object.outdir / "simout", checking_phrase)
+    if scanner.scan():
         return False
 
-    # now the simulation run time is within the interval for checking
-    has_done_booting_linux = False
-    with open(gem5run_object.outdir / "simout") as f:
-        for line in f.readlines():
-            line = line.strip()
-            if checking_phrase in line:
-                has_done_booting_linux = True
-                break
+    run_time = gem5run_object.current_time - gem5run_object.start_time
+    return run_time >= timeout
+
+
+# How long (in seconds) a KVM run of each benchmark may go without changing any of its output files before it is
+# killed, or None to never kill it for that. The SPEC and PARSEC workloads can legitimately run for hours without
+# printing anything, so they are not checked.
+name_no_output_timeout_map = {
+    'boot-exit': 6*60*60, # 6 hours
+    'npb': 6*60*60,
+    'gapbs': 6*60*60,
+    'parsec': None,
+    'parsec-20.04': None,
+    'spec-2006': None,
+    'spec-2017': None
+}
 
-    if has_done_booting_linux:
-        return False
-    return True
+# The no-output timeout of every benchmark, overriding name_no_output_timeout_map, and the time (in seconds) a run
+# may go without dumping stats once Linux has booted, or None to not check it; set by the launcher with
+# --no-output-timeout and --stats-dump-timeout before the runs are created. The run scripts only dump stats at the
+# end of the region of interest, so the stats dump check is only useful with a timeout longer than the workloads.
+no_output_timeout = None
+stats_dump_timeout = None
+
+# The detectors watching the runs of a benchmark for a lack of progress, as a function of the params of the run:
+# every run has to boot Linux within BOOTING_TIMEOUT, the KVM runs are also expected to keep writing some output,
+# and the runs may be expected to dump stats.
+def get_default_detectors(name, params):
+    detectors = [BootDetector(BOOTING_TIMEOUT)]
+    timeout = no_output_timeout if no_output_timeout is not None else name_no_output_timeout_map[name]
+    if params['cpu'] == 'kvm' and timeout:
+        detectors.append(OutputProgressDetector(timeout))
+    if stats_dump_timeout:
+        detectors.append(StatsDumpDetector(stats_dump_timeout))
+    return detectors
+
+name_detectors_map = {
+    'boot-exit': lambda name, params: get_default_detectors(name, params) + [ExitMarkerDetector(30*60)], # 30 minutes
+    'npb': get_default_detectors,
+    'gapbs': get_default_detectors,
+    'parsec': get_default_detectors,
+    'parsec-20.04': get_default_detectors,
+    'spec-2006': get_default_detectors,
+    'spec-2017': get_default_detectors
+}
+
+# return: the gem5art check_failure function of a run, running the detectors of its benchmark
+def get_detector_set(name, params):
+    return register_detector_set(get_outdir(name, params), name_detectors_map[name](name, params))
 
+# The runtime model of the past runs; set by the launcher before the runs are created.
+runtime_model = None
+
+# The timeout of a run: learned from the runtimes of the past runs of the same configuration plus a safety margin,
+# or `default_timeout` when there is not enough history.
+def get_timeout(name, params, default_timeout):
+    if runtime_model is None:
+        return default_timeout
+    return runtime_model.timeout(name, params, default_timeout)
 
 # https://github.com/darchr/gem5art-experiments/blob/master/launch-scripts/launch_boot_tests_gem5_20.py#L128
 def create_boot_exit_fs_run(params):
@@ -151,25 +362,26 @@ def create_boot_exit_fs_run(params):
         timeout = 12*60*60 # 12 hours
     else:
         timeout = 2*24*60*60 # 2 days
+    timeout = get_timeout('boot-exit', params, timeout)
     assert(mem_sys in gem5_binaries)
 
     gem5run = gem5Run.createFSRun(
         'boot-exit;'+RUN_NAME_SUFFIX, # name
         get_gem5_binary_path(mem_sys), # gem5_binary
         os.path.join(GEM5_RESOURCES_FOLDER, 'src/boot-exit/configs/run_exit.py'), # run_script
-        os.path.join(OUTPUT_FOLDER, 'boot-exit/{}/{}/{}/{}/{}/'. format(kernel, cpu, num_cpu, mem_sys, boot_type)), # outdir
+        get_outdir('boot-exit', params), # outdir
         gem5_binaries[mem_sys], # gem5_artifact
         gem5_repo, # gem5_git_artifact
         experiments_repo, # run_script_git_artifact
         os.path.join(LINUX_KERNELS_FOLDER, 'vmlinux'+'-'+kernel), # linux_binary
-        os.path.join(DISK_IMAGES_FOLDER, 'boot-exit.img'), # disk_image
+        get_run_disk_image_path('boot-exit'), # disk_image
         linux_binaries[kernel], # linux_binary_artifact
         boot_exit_artifacts.disk_image, # disk_image_artifact
         cpu, mem_sys, num_cpu, boot_type, # params
         timeout = timeout,
-        check_failure = lambda run_obj: linux_booting_check_failure(run_obj)
+        check_failure = get_detector_set('boot-exit', params)
     )
-    output_folder = os.path.join(OUTPUT_FOLDER, 'boot-exit/{}/{}/{}/{}/{}/'. format(kernel, cpu, num_cpu, mem_sys, boot_type))
+    output_folder = get_outdir('boot-exit', params)
     #assert(os.path.exists(os.path.join(output_folder, "../")))
     #assert(not os.path.exists(os.path.join(output_folder, "simout")))
     return gem5run
@@ -185,22 +397,23 @@ def create_npb_fs_run(params):
         timeout = 24*60*60 # 1 day
     else:
         timeout = 10*24*60*60 # 10 days
+    timeout = get_timeout('npb', params, timeout)
 
     gem5run = gem5Run.createFSRun(
         'npb;'+RUN_NAME_SUFFIX, # name
         get_gem5_binary_path(mem_sys), # gem5_binary
         os.path.join(GEM5_RESOURCES_FOLDER, 'src/npb/configs/run_npb.py'), # run_script
-        os.path.join(OUTPUT_FOLDER, 'npb/{}/{}/{}/{}/{}/'. format(kernel, cpu, num_cpu, mem_sys, workload)), # outdir
+        get_outdir('npb', params), # outdir
         gem5_binaries[mem_sys], # gem5_artifact
         gem5_repo, # gem5_git_artifact
         experiments_repo, # run_script_git_artifact
         os.path.join(LINUX_KERNELS_FOLDER, 'vmlinux'+'-'+kernel), # linux_binary
-        os.path.join(DISK_IMAGES_FOLDER, 'npb.img'), # disk_image
+        get_run_disk_image_path('npb'), # disk_image
         linux_binaries[kernel], # linux_binary_artifact
         npb_artifacts.disk_image, # disk_image_artifact
         cpu, mem_sys, workload, num_cpu, # params
         timeout = timeout,
-        check_failure = lambda run_obj: linux_booting_check_failure(run_obj)
+        check_failure = get_detector_set('npb', params)
     )
     return gem5run
 
@@ -216,22 +429,23 @@ def create_gapbs_fs_run(params):
         timeout = 24*60*60 # 1 day
     else:
         timeout = 10*24*60*60 # 10 days
+    timeout = get_timeout('gapbs', params, timeout)
 
     gem5run = gem5Run.createFSRun(
         'gapbs;'+RUN_NAME_SUFFIX, # name
         get_gem5_binary_path(mem_sys), # gem5_binary
         os.path.join(GEM5_RESOURCES_FOLDER, 'src/gapbs/configs/run_gapbs.py'), # run_script
-        os.path.join(OUTPUT_FOLDER, 'gapbs/{}/{}/{}/{}/{}/{}/{}/'. format(kernel, cpu, num_cpu, mem_sys, workload, synthetic, n_nodes)), # outdir
+        get_outdir('gapbs', params), # outdir
         gem5_binaries[mem_sys], # gem5_artifact
         gem5_repo, # gem5_git_artifact
         experiments_repo, # run_script_git_artifact
         os.path.join(LINUX_KERNELS_FOLDER, 'vmlinux'+'-'+kernel), # linux_binary
-        os.path.join(DISK_IMAGES_FOLDER, 'gapbs.img'), # disk_image
+        get_run_disk_image_path('gapbs'), # disk_image
         linux_binaries[kernel], # linux_binary_artifact
         gapbs_artifacts.disk_image, # disk_image_artifact
         cpu, num_cpu, mem_sys, workload, synthetic, n_nodes, # params
         timeout = timeout,
-        check_failure = lambda run_obj: linux_booting_check_failure(run_obj)
+        check_failure = get_detector_set('gapbs', params)
     )
     return gem5run
 
@@ -247,6 +461,7 @@ def create_parsec_fs_run(params):
         timeout = 24*60*60 # 1 day
     else:
         timeout = 10*24*60*60 # 10 days
+    timeout = get_timeout('parsec', params, timeout)
 
     if mem_sys == "classic":
         run_script = os.path.join(GEM5_RESOURCES_FOLDER, "src/parsec/configs/run_parsec.py")
@@ -257,17 +472,17 @@ def create_parsec_fs_run(params):
         'parsec;'+RUN_NAME_SUFFIX, # name
         get_gem5_binary_path(mem_sys), # gem5_binary
         run_script, # run_script
-        os.path.join(OUTPUT_FOLDER, 'parsec/{}/{}/{}/{}/{}/{}/'. format(kernel, cpu, num_cpu, mem_sys, workload, size)), # outdir
+        get_outdir('parsec', params), # outdir
         gem5_binaries[mem_sys], # gem5_artifact
         gem5_repo, # gem5_git_artifact
         experiments_repo, # run_script_git_artifact
         os.path.join(LINUX_KERNELS_FOLDER, 'vmlinux'+'-'+kernel), # linux_binary
-        os.path.join(DISK_IMAGES_FOLDER, 'parsec.img'), # disk_image
+        get_run_disk_image_path('parsec'), # disk_image
         linux_binaries[kernel], # linux_binary_artifact
         parsec_artifacts.disk_image, # disk_image_artifact
         cpu, workload, size, num_cpu, # params
         timeout = timeout,
-        check_failure = lambda run_obj: linux_booting_check_failure(run_obj)
+        check_failure = get_detector_set('parsec', params)
     )
     return gem5run
 
@@ -283,6 +498,7 @@ def create_parsec_20_04_fs_run(params):
         timeout = 24*60*60 # 1 day
     else:
         timeout = 10*24*60*60 # 10 days
+    timeout = get_timeout('parsec-20.04', params, timeout)
 
     if mem_sys == "classic":
         run_script = os.path.join(GEM5_RESOURCES_FOLDER, "src/parsec/configs/run_parsec.py")
@@ -293,17 +509,17 @@ def create_parsec_20_04_fs_run(params):
         'parsec-20.04;'+RUN_NAME_SUFFIX, # name
         get_gem5_binary_path(mem_sys), # gem5_binary
         run_script, # run_script
-        os.path.join(OUTPUT_FOLDER, 'parsec-20.04/{}/{}/{}/{}/{}/{}/'. format(kernel, cpu, num_cpu, mem_sys, workload, size)), # outdir
+        get_outdir('parsec-20.04', params), # outdir
         gem5_binaries[mem_sys], # gem5_artifact
         gem5_repo, # gem5_git_artifact
         experiments_repo, # run_script_git_artifact
         os.path.join(LINUX_KERNELS_FOLDER, 'vmlinux'+'-'+kernel), # linux_binary
-        os.path.join(DISK_IMAGES_FOLDER, 'parsec-20.04'), # disk_image
+        get_run_disk_image_path('parsec-20.04'), # disk_image
         linux_binaries[kernel], # linux_binary_artifact
         parsec_20_04_artifacts.disk_image, # disk_image_artifact
         cpu, workload, size, num_cpu, # params
         timeout = timeout,
-        check_failure = lambda run_obj: linux_booting_check_failure(run_obj)
+        check_failure = get_detector_set('parsec-20.04', params)
     )
     return gem5run
 
@@ -317,22 +533,23 @@ def create_spec_2006_fs_run(params):
         timeout = 24*60*60 # 1 day
     else:
         timeout = 20*24*60*60 # 20 days
+    timeout = get_timeout('spec-2006', params, timeout)
 
     gem5run = gem5Run.createFSRun(
         'spec-2006;'+RUN_NAME_SUFFIX, # name
         get_gem5_binary_path(mem_sys), # gem5 binary
         os.path.join(GEM5_RESOURCES_FOLDER, 'src/spec-2006/configs/run_spec.py'), # run_script
-        os.path.join(OUTPUT_FOLDER, 'spec-2006/{}/{}/{}/{}/{}/'. format(kernel, cpu, mem_sys, workload, size)), # outdir
+        get_outdir('spec-2006', params), # outdir
         gem5_binaries[mem_sys], # gem5_artifact
         gem5_repo, # gem5_git_artifact
         experiments_repo, # run_script_git_artifact
         os.path.join(LINUX_KERNELS_FOLDER, 'vmlinux'+'-'+kernel), # linux_binary
-        os.path.join(DISK_IMAGES_FOLDER, 'spec-2006'), # disk_image
+        get_run_disk_image_path('spec-2006'), # disk_image
         linux_binaries[kernel], # linux_binary_artifact
         spec_2006_artifacts.disk_image, # disk_image_artifact
         cpu, mem_sys, workload, size, # params
         timeout = timeout,
-        check_failure = lambda run_obj: linux_booting_check_failure(run_obj)
+        check_failure = get_detector_set('spec-2006', params)
     )
     return gem5run
 
@@ -345,22 +562,23 @@ def create_spec_2017_fs_run(params):
         timeout = 24*60*60 # 1 day
     else:
         timeout = 20*24*60*60 # 20 days
+    timeout = get_timeout('spec-2017', params, timeout)
 
     gem5run = gem5Run.createFSRun(
         'spec-2017;'+RUN_NAME_SUFFIX, # name
         get_gem5_binary_path('classic'), # gem5_binary
         os.path.join(GEM5_RESOURCES_FOLDER, 'src/spec-2017/configs/run_spec.py'), # run_script
-        os.path.join(OUTPUT_FOLDER, 'spec-2017/{}/{}/{}/{}/'. format(kernel, cpu, workload, size)), # outdir
+        get_outdir('spec-2017', params), # outdir
         gem5_binaries['classic'], # gem5_artifact
         gem5_repo, # gem5_git_artifact
         experiments_repo, # run_script_git_artifact
         os.path.join(LINUX_KERNELS_FOLDER, 'vmlinux'+'-'+kernel), # linux_binary
-        os.path.join(DISK_IMAGES_FOLDER, 'spec-2017'), # disk_image
+        get_run_disk_image_path('spec-2017'), # disk_image
         linux_binaries[kernel], # linux_binary_artifact
         spec_2017_artifacts.disk_image, # disk_image_artifact
         cpu, workload, size, # params
         timeout = timeout,
-        check_failure = lambda run_obj: linux_booting_check_failure(run_obj)
+        check_failure = get_detector_set('spec-2017', params)
     )
     return gem5run
 
@@ -374,66 +592,369 @@ name_create_fs_run_map = {
     'spec-2017': create_spec_2017_fs_run
 }
 
-create_fs_run = lambda name, params: name_create_fs_run_map[name](params)
+# the field of the input space (see input_space.py) holding the values of each param
+param_input_space_fields = {
+    'kernel': 'kernels',
+    'cpu': 'cpu_types',
+    'mem_sys': 'mem_sys',
+    'num_cpu': 'num_cpus',
+    'boot_type': 'boot_types',
+    'workload': 'workloads',
+    'size': 'sizes',
+    'synthetic': 'synthetic',
+    'n_nodes': 'n_nodes'
+}
+
+# Checks that a job submitted to the launcher daemon can be run: it has exactly the params of its benchmark, and
+# their values are in the input space of the benchmark.
+def validate_job(name, params):
+    if not name in name_create_fs_run_map:
+        raise ValueError("Unknown fs run name: {}".format(name))
+    missing = [param for param in name_outdir_params_map[name] if not param in params]
+    if missing:
+        raise ValueError("Missing params for {}: {}".format(name, ", ".join(missing)))
+    unknown = [param for param in params if not param in name_outdir_params_map[name]]
+    if unknown:
+        raise ValueError("Unknown params for {}: {}".format(name, ", ".join(unknown)))
+    input_params = input_space.name_params_map[name]
+    for param, value in params.items():
+        if not value in getattr(input_params, param_input_space_fields[param]):
+            raise ValueError("Invalid {} for {}: {}".format(param, name, value))
+    if gem5Run is not None and not params['kernel'] in linux_binaries:
+        raise ValueError("No kernel binary for {}".format(params['kernel']))
+
+def create_fs_run(name, params):
+    load_artifacts([name])
+    return name_create_fs_run_map[name](params)
+
+# gem5art does not run gem5 for a run whose hash, made from its artifacts, run script and params, is already in its
+# database: the run returns at once, as if it had succeeded. A job run again after a failure (a retry, or a failed
+# job retried by --resume) has the same hash as its failed run, so it is given a hash of its own, derived from the
+# hash and the id of the run. The runs of a job get the first hash only while its first run is the only one, so
+# the document of the first hash is always the first run.
+def prepare_rerun(run):
+    from gem5art import artifact
+    document = artifact.getDBConnection().get(run.hash)
+    if document is not None and not result_cache.is_successful_run(document):
+        run.hash = hashlib.md5("{}-{}".format(run.hash, run._id).encode()).hexdigest()
+
+# return: True if gem5 has been run, rather than gem5art returning before running it (e.g. the run is already in its
+#         database, or an artifact has changed)
+def has_run(run):
+    return getattr(run, 'status', None) in ("Finished", "Failed")
+
+# A run has failed if it has not been run, if gem5art killed it (timeout or check_failure) or if gem5 exited with
+# an error.
+def get_run_status(run):
+    if not has_run(run):
+        return ledger.FAILURE
+    if getattr(run, 'kill_reason', None):
+        return ledger.FAILURE
+    if getattr(run, 'return_code', 0):
+        return ledger.FAILURE
+    return ledger.SUCCESS
+
+# return: the key of the inputs of the run of a job (see result_cache.py)
+def get_job_result_key(name, params):
+    run = create_fs_run(name, params)
+    pop_detector_set(run.outdir) # the run is never run
+    return result_cache.get_result_key(run)
+
+# Reuses the outputs of the successful runs, of this or of earlier campaigns, that had the same inputs as the jobs:
+# the outputs are copied into the output folders of the jobs, and the jobs are recorded as successful in the ledger.
+#
+# return: the jobs that have to be run
+def reuse_results(jobs, result_index, completion_ledger):
+    remaining_jobs = []
+    n_reused = 0
+    for job in jobs:
+        name, params = job
+        key = get_job_result_key(name, params)
+        cached_outdir = result_index.lookup(key, completion_ledger)
+        if cached_outdir is None:
+            remaining_jobs.append(job)
+            continue
+        outdir = get_outdir(name, params)
+        if not os.path.normpath(cached_outdir) == os.path.normpath(outdir):
+            result_cache.copy_outputs(cached_outdir, outdir)
+        completion_ledger.record(job_id(name, params), name, params, ledger.SUCCESS, outdir,
+                                 result_key = key, reused_from = cached_outdir)
+        n_reused += 1
+    print("Reused the results of {} jobs".format(n_reused))
+    return remaining_jobs
+
+# Packs the output folder of a finished run into its archive (see run_archive.py).
+def pack_run_outputs(outdir):
+    try:
+        run_archive.pack_outdir(outdir)
+    except OSError as err:
+        print("Could not pack {}: {}".format(outdir, err))
+
+# return: the path of the error log of a job, ERR_FOLDER/<benchmark>/<param 0>_<param 1>_...
+def get_error_log_path(name, params):
+    return os.path.join(ERR_FOLDER, name, "_".join(params.values()))
 
 def worker(job):
     name, params = job
-    run = create_fs_run(name, params)
-    print("Starting running", name, params)
     try:
-        run.run()
+        with stage_disk_image(name, params):
+            run = create_fs_run(name, params)
+            print("Starting running", name, params)
+            error = None
+            with RunTelemetry() as run_telemetry:
+                try:
+                    prepare_rerun(run)
+                    run.run()
+                    status = get_run_status(run)
+                except Exception as err:
+                    status = ledger.FAILURE
+                    error = traceback.format_exc()
+                finally:
+                    # gem5Run.run() leaves a SIGTERM handler killing its gem5 process in the worker, which would keep
+                    # the pool from terminating the worker once gem5 has exited
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    except Exception as err: # staging the disk image or creating the run has failed
+        return fail_setup(name, params, traceback.format_exc())
+    return finish_run(name, params, run, status, error, run_telemetry)
+
+# The worker of the jobs with --supervisor: the same as `worker()`, but as a coroutine run by the supervisor in the
+# launcher process (see supervisor.py).
+async def supervised_worker(job):
+    name, params = job
+    loop = asyncio.get_running_loop()
+    staging = stage_disk_image(name, params)
+    # staging may copy a disk image, and creating the run hashes and looks up its artifacts, so only waiting for the
+    # run is done on the event loop
+    try:
+        await loop.run_in_executor(None, staging.__enter__)
     except Exception as err:
-        filepath = os.path.join(ERR_FOLDER, "_".join(list(params.values())))
-        traceback.print_exc(file=open(filepath, "w"))
+        return await loop.run_in_executor(None, fail_setup, name, params, traceback.format_exc())
+    try:
+        try:
+            run = await loop.run_in_executor(None, create_fs_run, name, params)
+        except Exception as err:
+            return await loop.run_in_executor(None, fail_setup, name, params, traceback.format_exc())
+        print("Starting running", name, params)
+        error = None
+        run_telemetry = ProcessTelemetry()
+        start_time = time.time()
+        try:
+            await loop.run_in_executor(None, prepare_rerun, run)
+            await supervise_run(run, GEM5RUN_CHECK_FAILURE_INTERVAL, run_telemetry.sample)
+            status = get_run_status(run)
+        except Exception as err:
+            status = ledger.FAILURE
+            error = traceback.format_exc()
+        run_telemetry.finish(time.time() - start_time)
+    finally:
+        await loop.run_in_executor(None, staging.__exit__, None, None, None)
+    return await loop.run_in_executor(None, finish_run, name, params, run, status, error, run_telemetry)
+
+# Releases the resources of a finished run, saves its telemetry, classifies its failure if it has failed and
+# writes its error log.
+#
+# return: the result of the job, passed to the launcher
+def finish_run(name, params, run, status, error, run_telemetry):
+    forget_scanners(run.outdir / "simout")
+    detector_set = pop_detector_set(run.outdir)
+    if os.path.isdir(run.outdir):
+        run_telemetry.save(run.outdir)
+    failure_reason = detector_set.reason if detector_set is not None else None
+    failure_class = None
+    if status == ledger.FAILURE:
+        kill_reason = getattr(run, 'kill_reason', None)
+        failure_class = failures.classify_failure(error,
+                                                  failures.read_tail(run.outdir / "simout"),
+                                                  failures.read_tail(run.outdir / "simerr"),
+                                                  kill_reason, failure_reason)
+        failure_reason = failure_reason or kill_reason or (error.strip().splitlines()[-1] if error else None) \
+                         or ("return code {}".format(getattr(run, 'return_code', None)) if has_run(run) else
+                             "gem5 was not run (run status: {}), e.g. a run with the same inputs is already in the "
+                             "gem5art database".format(getattr(run, 'status', None)))
+        write_error_log(name, params, failure_class, failure_reason, error)
+    result_key = result_cache.get_result_key(run) if status == ledger.SUCCESS else None
+    return {'status': status, 'wall_time': run_telemetry.record['wall_time'], 'telemetry': run_telemetry.record,
+            'failure_reason': failure_reason, 'failure_class': failure_class, 'result_key': result_key}
+
+# Ends a job whose run could not be started, e.g. its disk image could not be staged or an artifact could not be
+# found: the job has failed without running gem5, and is recorded and retried as any other failed job.
+#
+# return: the result of the job, passed to the launcher
+def fail_setup(name, params, error):
+    failure_class = failures.classify_failure(error, None, None)
+    failure_reason = "could not start the run: {}".format(error.strip().splitlines()[-1])
+    write_error_log(name, params, failure_class, failure_reason, error)
+    return {'status': ledger.FAILURE, 'wall_time': 0, 'telemetry': None,
+            'failure_reason': failure_reason, 'failure_class': failure_class, 'result_key': None}
+
+def write_error_log(name, params, failure_class, failure_reason, error):
+    filepath = get_error_log_path(name, params)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, "w") as f:
+        f.write("{}\n{} failure: {}\n".format(job_id(name, params), failure_class, failure_reason))
+        if error:
+            f.write(error)
 
 if __name__ == "__main__":
     parser = parser = argparse.ArgumentParser(description='Launch gem5art experiment.')
     parser.add_argument('--test', action='store_true', default = False)
+    parser.add_argument('--resume', action='store_true', default = False,
+                        help='skip the jobs that the ledger records as successful')
+    parser.add_argument('--shard', type=parse_shard, default = None, metavar='i/N',
+                        help='only run shard i (0 <= i < N) of N shards of the jobs')
+    parser.add_argument('--cores', type=int, default = mp.cpu_count(),
+                        help='number of host cores the runs may occupy')
+    parser.add_argument('--memory', type=float, default = 0.9 * get_host_memory_gb(),
+                        help='amount of host memory (in GB) the runs may occupy')
+    parser.add_argument('--status-interval', type=float, default = 30,
+                        help='how often (in seconds) the status of the campaign is written to status.txt')
+    parser.add_argument('--max-retries', type=int, default = 2,
+                        help='how many times a job failing for a transient reason (e.g. KVM busy, NFS errors) is retried')
+    parser.add_argument('--retry-backoff', type=float, default = 60,
+                        help='delay (in seconds) before the first retry of a job, doubled at each retry')
+    parser.add_argument('--no-output-timeout', type=float, default = None, metavar='SECONDS',
+                        help='kill the KVM runs of every benchmark that have not changed any output file for SECONDS '
+                             '(0 to never kill them), instead of the timeout of their benchmark in name_no_output_timeout_map')
+    parser.add_argument('--stats-dump-timeout', type=float, default = None, metavar='SECONDS',
+                        help='kill the runs that have not dumped stats for SECONDS after booting Linux')
+    parser.add_argument('--stage-disk-images', default = None, metavar='FOLDER',
+                        help='copy the disk images to a cache in FOLDER, on a local disk, before running them')
+    parser.add_argument('--staging-budget', type=float, default = 100,
+                        help='size (in GB) of the disk image cache')
+    parser.add_argument('--pack-outputs', action='store_true', default = False,
+                        help='pack the output folder of each finished run into one compressed archive')
+    parser.add_argument('--reuse-results', action='store_true', default = False,
+                        help='do not run the jobs whose inputs (artifacts, run script and params) are the same as '
+                             'those of a successful run, and copy the outputs of that run instead')
+    parser.add_argument('--supervisor', action='store_true', default = False,
+                        help='run all the gem5 processes from the launcher process, rather than each from its own '
+                             'worker process')
+    parser.add_argument('--daemon', default = None, metavar='SOCKET',
+                        help='keep running after the jobs of the campaign have been run, and accept new jobs, changes '
+                             'of priority, cancellations and status queries on the Unix socket SOCKET (see launcher_daemon.py)')
+    parser.add_argument('--queue', default = None, metavar='FOLDER',
+                        help='pull the jobs from a work queue in FOLDER, on a filesystem shared with the other hosts '
+                             'running the campaign, creating the queue with the jobs of the campaign if it does not exist')
+    parser.add_argument('--lease-time', type=float, default = LEASE_TIME,
+                        help='time (in seconds) after which the jobs claimed from the work queue by a host that has '
+                             'stopped renewing its leases can be claimed by other hosts')
     args = parser.parse_args()
+    if args.queue is not None and (args.shard is not None or args.daemon is not None):
+        parser.error("--queue cannot be used with --shard or --daemon")
+    if args.daemon is not None and is_daemon_listening(args.daemon):
+        parser.error("a launcher daemon is already listening on {}".format(args.daemon))
 
     #def boot_exit_filter(name, params):
     #    if not name == "boot-exit":
     #        return False
     #    return True
 
-    def kvm_filter(name, params):
+    def kvm_filter(params):
         if not params["cpu"] == "kvm":
             return False
         return True
 
-    jobs = list(get_jobs_iterator(kvm_filter))
+    custom_constraints = [Constraint(['cpu'], kvm_filter)]
+
+    no_output_timeout = args.no_output_timeout
+    stats_dump_timeout = args.stats_dump_timeout
+
+    runtime_model = RuntimeModel(RUNTIME_HISTORY_FILE)
+    completion_ledger = ledger.CompletionLedger(LEDGER_FILE)
+    if completion_ledger.n_lines > 2 * len(completion_ledger.records):
+        completion_ledger.compact()
+
+    jobs = get_jobs_iterator(custom_constraints = custom_constraints)
+    # shard before looking at the ledger, which is local to each host
+    if args.shard is not None:
+        jobs = shard_jobs(jobs, *args.shard)
+    if args.resume:
+        jobs = ledger.get_unfinished_jobs(jobs, completion_ledger, job_id, get_outdir)
+    # the jobs are gone through several times below
+    jobs = list(longest_expected_first(jobs, runtime_model))
 
     with open('jobs', 'w') as f:
         for job in jobs:
-            f.write(str(job))
+            f.write(str(tuple(job)))
             f.write("\n")
 
-
     if not args.test:
-        run_names = {name for name, _ in jobs}
-
-        # since disk image artifacts are huge, here we lazily import artifacts as needed
         # we should do this before spliting the jobs to multiple processes as we don't want to import those artifacts multiple times
-        for name in run_names:
-            print("Loading {} artifacts".format(name))
-            if name == "boot-exit":
-                boot_exit_artifacts = get_boot_exit_artifacts()
-            elif name == "npb":
-                npb_artifacts = get_npb_artifacts()
-            elif name == "gapbs":
-                gapbs_artifacts = get_gapbs_artifacts()
-            elif name == "parsec":
-                parsec_artifacts = get_parsec_artifacts()
-            elif name == "parsec-20.04":
-                parsec_20_04_artifacts = get_parsec_20_04_artifacts()
-            elif name == "spec-2006":
-                spec_2006_artifacts = get_spec_2006_artifacts()
-            elif name == "spec-2017":
-                spec_2017_artifacts = get_spec_2017_artifacts()
-            else:
-                raise Error("Unknown fs run name")
+        load_artifacts({job.name for job in jobs})
 
-    if not args.test:
-        with mp.Pool(mp.cpu_count() // 2) as pool:
-            pool.map(worker, jobs)
+    result_index = result_cache.ResultIndex(RESULT_INDEX_FILE)
+    if not args.test and args.reuse_results:
+        jobs = reuse_results(jobs, result_index, completion_ledger)
+
+    if not args.test and args.stage_disk_images is not None:
+        disk_image_stager = DiskImageStager(args.stage_disk_images, args.staging_budget * 1024 ** 3)
 
+    work_queue = None
+    if not args.test and args.queue is not None:
+        work_queue = WorkQueue(args.queue, lease_time = args.lease_time)
+        if work_queue.populate(jobs):
+            print("Created the work queue in {} with {} jobs".format(args.queue, len(jobs)))
+        else:
+            print("Joining the work queue in {}".format(args.queue))
+
+    if not args.test:
+        # every job occupies at least one core, so there are never more than
+        # `args.cores` jobs running at the same time
+        with (RunSupervisor() if args.supervisor else mp.Pool(args.cores)) as pool:
+            attempts = collections.Counter()
+            packer = concurrent.futures.ThreadPoolExecutor(PACKING_WORKERS) if args.pack_outputs else None
+            failure_summary = failures.FailureSummary()
+            def on_done(job, result):
+                name, params = job
+                attempts[job] += 1
+                runtime_model.record(name, params, result['status'], result['wall_time'])
+                completion_ledger.record(job_id(name, params), name, params, result['status'], get_outdir(name, params),
+                                         telemetry = result['telemetry'], failure_reason = result['failure_reason'],
+                                         failure_class = result['failure_class'], attempt = attempts[job],
+                                         result_key = result['result_key'])
+                if result['result_key'] is not None:
+                    result_index.record(result['result_key'], get_outdir(name, params), job_id(name, params))
+                if result['failure_class'] == failures.TRANSIENT and attempts[job] <= args.max_retries:
+                    progress.on_requeue(job)
+                    scheduler.requeue(job, failures.get_retry_delay(attempts[job], args.retry_backoff))
+                    return
+                if result['status'] == ledger.FAILURE:
+                    failure_summary.add(job_id(name, params), result['failure_class'], result['failure_reason'], attempts[job])
+                progress.on_done(job, result['status'], result['wall_time'])
+                if work_queue is not None:
+                    work_queue.complete(job)
+                if packer is not None and os.path.isdir(get_outdir(name, params)):
+                    packer.submit(pack_run_outputs, get_outdir(name, params))
+            scheduler = JobScheduler(pool, supervised_worker if args.supervisor else worker, args.cores, args.memory, on_done = on_done,
+                                     lookahead = QUEUE_LOOKAHEAD if work_queue is not None else 64)
+            # with --queue, the jobs are counted as they are claimed
+            progress = CampaignProgress(jobs if work_queue is None else [], scheduler, runtime_model, job_cost, STATUS_FILE, args.status_interval)
+            scheduler.on_dispatch = progress.on_dispatch
+            progress.start()
+            try:
+                if args.daemon is not None:
+                    job_queue = JobQueue(scheduler.condition)
+                    for job in jobs:
+                        job_queue.submit(job)
+                    server = DaemonServer(args.daemon, job_queue, scheduler, validate_job, progress.on_submit,
+                                          progress.on_cancel,
+                                          lambda: ([job_id(*job) for job in progress.get_running_jobs()], progress.get_status()))
+                    server.start()
+                    print("Listening on {}".format(args.daemon))
+                    try:
+                        scheduler.serve(job_queue)
+                    finally:
+                        server.stop()
+                elif work_queue is not None:
+                    work_queue.start()
+                    try:
+                        scheduler.run(work_queue.claim_jobs(progress.on_submit))
+                    finally:
+                        work_queue.stop()
+                else:
+                    scheduler.run(jobs)
+            finally:
+                if packer is not None:
+                    packer.shutdown(wait = True)
+                progress.stop()
+                failure_summary.write(FAILURE_SUMMARY_FILE)
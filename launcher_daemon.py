@@ -0,0 +1,259 @@
+import argparse
+import heapq
+import itertools
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+
+from jobs import JobSpec
+
+# A queue of jobs ordered by priority (higher first), then by submission
+# order, to which jobs can be submitted, reprioritized and cancelled while
+# JobScheduler.serve() dispatches them.
+#
+# The queue shares the condition of the scheduler, so every change wakes the
+# scheduler up. A job is queued or running at most once: it leaves the queue
+# when it is dispatched or cancelled, and cannot be submitted again until it
+# has finished.
+#
+# The heap keeps one entry per submission or change of priority; the entries
+# superseded by a later one, or of cancelled jobs, are dropped when they reach
+# the top of the heap.
+class JobQueue:
+    def __init__(self, condition):
+        self.condition = condition
+        self.heap = [] # (-priority, sequence number, job)
+        self.entries = {} # job -> its current heap entry
+        self.ids = {} # job id -> job
+        self.dispatched = set() # ids of the jobs dispatched and not finished yet
+        self.sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def push(self, job, priority):
+        entry = (-priority, next(self.sequence), job)
+        self.entries[job] = entry
+        heapq.heappush(self.heap, entry)
+        self.condition.notify()
+
+    # return: the id of the job
+    def submit(self, job, priority = 0):
+        with self.condition:
+            if job in self.entries:
+                raise ValueError("{} is already queued".format(job.id))
+            if job.id in self.dispatched:
+                raise ValueError("{} is already running".format(job.id))
+            self.ids[job.id] = job
+            self.push(job, priority)
+        return job.id
+
+    def get(self, id):
+        job = self.ids.get(id, None)
+        if job is None or not job in self.entries:
+            raise KeyError("{} is not queued".format(id))
+        return job
+
+    def reprioritize(self, id, priority):
+        with self.condition:
+            self.push(self.get(id), priority)
+
+    def cancel(self, id):
+        with self.condition:
+            self.remove(self.get(id))
+
+    def remove(self, job):
+        with self.condition:
+            del self.entries[job]
+            del self.ids[job.id]
+
+    # The scheduler has dispatched the job.
+    def take(self, job):
+        with self.condition:
+            self.remove(job)
+            self.dispatched.add(job.id)
+
+    # The job has finished (and will not be retried), so it can be submitted again.
+    def finish(self, job):
+        with self.condition:
+            self.dispatched.discard(job.id)
+
+    # return: the first `n` queued jobs
+    def candidates(self, n):
+        with self.condition:
+            jobs = []
+            popped = []
+            while self.heap and len(jobs) < n:
+                entry = heapq.heappop(self.heap)
+                if self.entries.get(entry[2], None) == entry:
+                    jobs.append(entry[2])
+                    popped.append(entry)
+            for entry in popped:
+                heapq.heappush(self.heap, entry)
+            return jobs
+
+    # return: [(job id, priority)] of all the queued jobs, in the order they will be considered
+    def list(self):
+        with self.condition:
+            return [(job.id, -entry[0]) for job, entry in sorted(self.entries.items(), key = lambda item: item[1][:2])]
+
+# return: True if a daemon is listening on the Unix socket `path`, rather than the socket being left over by a daemon
+#         that has exited
+def is_daemon_listening(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(path)
+        except OSError: # e.g. no such file, or connection refused
+            return False
+    return True
+
+# The API of the launcher daemon, on a Unix socket.
+#
+# A client sends one JSON request per line and reads one JSON reply per line,
+# {"ok": true, ...} or {"ok": false, "error": "..."}. The requests are
+#   {"op": "submit", "name": "npb", "params": {...}, "priority": 0} -> {"job_id": "..."}
+#   {"op": "priority", "job_id": "...", "priority": 10}
+#   {"op": "cancel", "job_id": "..."}          (only a queued job can be cancelled)
+#   {"op": "status"}                           -> {"queued": [[job id, priority], ...], "running": [...], "status": "..."}
+#   {"op": "shutdown"}                         (stops dispatching, and exits once the running jobs have finished)
+#
+# Each client is served by its own thread; a client disconnecting, or sending
+# a bad request, does not affect the queue or the other clients. The server
+# refuses to start on the socket of a daemon that is still listening.
+#
+# validate: called with (name, params) of a submitted job, raises ValueError if it cannot be run.
+# on_submit: called with a submitted job once it is queued.
+# on_cancel: called with a cancelled job once it has left the queue.
+# get_status: returns (the running job ids, the status of the campaign as text).
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, job_queue, scheduler, validate, on_submit = None, on_cancel = None, get_status = None):
+        if is_daemon_listening(path):
+            raise OSError("a launcher daemon is already listening on {}".format(path))
+        if os.path.exists(path): # left over by an earlier daemon
+            os.remove(path)
+        super().__init__(path, DaemonRequestHandler)
+        self.path = path
+        self.job_queue = job_queue
+        self.scheduler = scheduler
+        self.validate = validate
+        self.on_submit = on_submit
+        self.on_cancel = on_cancel
+        self.get_status = get_status
+        self.thread = threading.Thread(target = self.serve_forever, daemon = True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        os.remove(self.path)
+
+    def handle_request_message(self, request):
+        op = request.get('op', None)
+        if op == 'submit':
+            name, params = request['name'], {key: str(value) for key, value in request['params'].items()}
+            self.validate(name, params)
+            job = JobSpec.from_params(name, params)
+            with self.scheduler.condition: # the job is counted before the scheduler can dispatch it
+                self.job_queue.submit(job, int(request.get('priority', 0)))
+                if self.on_submit is not None:
+                    self.on_submit(job)
+            return {'job_id': job.id}
+        if op == 'priority':
+            self.job_queue.reprioritize(request['job_id'], int(request['priority']))
+            return {}
+        if op == 'cancel':
+            with self.scheduler.condition:
+                job = self.job_queue.get(request['job_id'])
+                self.job_queue.remove(job)
+                if self.on_cancel is not None:
+                    self.on_cancel(job)
+            return {}
+        if op == 'status':
+            running, status = self.get_status() if self.get_status is not None else ([], "")
+            return {'queued': self.job_queue.list(), 'running': running, 'status': status}
+        if op == 'shutdown':
+            self.scheduler.stop()
+            return {}
+        raise ValueError("unknown op {!r}".format(op))
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.handle_request_message(json.loads(line))
+                reply['ok'] = True
+            except (ValueError, KeyError, TypeError, AttributeError) as err:
+                reply = {'ok': False, 'error': str(err)}
+            try:
+                self.wfile.write((json.dumps(reply) + "\n").encode())
+            except OSError: # the client has disconnected
+                return
+
+# Sends one request to the daemon listening on `path`.
+#
+# return: the reply of the daemon
+def send_request(path, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        with sock.makefile('rwb') as f:
+            f.write((json.dumps(request) + "\n").encode())
+            f.flush()
+            return json.loads(f.readline())
+
+def parse_param(text):
+    key, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError("expected key=value, got {!r}".format(text))
+    return key, value
+
+# A client of the daemon, e.g.
+#   python3 launcher_daemon.py daemon.sock submit npb kernel=4.19.83 cpu=kvm num_cpu=8 mem_sys=classic workload=is.A.x --priority 5
+#   python3 launcher_daemon.py daemon.sock priority 'npb:cpu=kvm,...' 10
+#   python3 launcher_daemon.py daemon.sock cancel 'npb:cpu=kvm,...'
+#   python3 launcher_daemon.py daemon.sock status
+#   python3 launcher_daemon.py daemon.sock shutdown
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Send a request to the launcher daemon (launch_tests.py --daemon).')
+    parser.add_argument('socket', help='the socket of the daemon')
+    subparsers = parser.add_subparsers(dest='op', required=True)
+    submit_parser = subparsers.add_parser('submit', help='queue a job')
+    submit_parser.add_argument('name', help='the benchmark, e.g. npb')
+    submit_parser.add_argument('params', type=parse_param, nargs='+', metavar='key=value')
+    submit_parser.add_argument('--priority', type=int, default = 0, help='jobs with a higher priority are dispatched first')
+    priority_parser = subparsers.add_parser('priority', help='change the priority of a queued job')
+    priority_parser.add_argument('job_id')
+    priority_parser.add_argument('priority', type=int)
+    cancel_parser = subparsers.add_parser('cancel', help='remove a queued job')
+    cancel_parser.add_argument('job_id')
+    subparsers.add_parser('status', help='print the queued and running jobs')
+    subparsers.add_parser('shutdown', help='stop the daemon once the running jobs have finished')
+    args = parser.parse_args()
+
+    request = {'op': args.op}
+    if args.op == 'submit':
+        request.update(name = args.name, params = dict(args.params), priority = args.priority)
+    elif args.op in ('priority', 'cancel'):
+        request['job_id'] = args.job_id
+        if args.op == 'priority':
+            request['priority'] = args.priority
+    reply = send_request(args.socket, request)
+    if not reply.pop('ok'):
+        print("Error:", reply['error'], file = sys.stderr)
+        sys.exit(1)
+    if args.op == 'submit':
+        print(reply['job_id'])
+    elif args.op == 'status':
+        print(reply['status'], end = '')
+        print("\nrunning:")
+        for id in reply['running']:
+            print("  " + id)
+        print("queued:")
+        for id, priority in reply['queued']:
+            print("  {:>4} {}".format(priority, id))
@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+import run_archive
+
+# The statuses a job can end with.
+SUCCESS = 'success'
+FAILURE = 'failure'
+
+# Files that every finished gem5 run leaves in its output folder.
+RUN_OUTPUT_FILES = ['simout', 'stats.txt']
+
+# A persistent record of the terminal status of every job of a campaign.
+#
+# The ledger is an append-only JSON-lines file; each line records the status
+# of one finished job, and a later line for the same job supersedes the
+# earlier ones. Appending a line is the only write, so a crash of the launcher
+# can at most lose the last, partially written, line.
+class CompletionLedger:
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.n_lines = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError: # a partially written line
+                        continue
+                    self.records[record['job_id']] = record
+                    self.n_lines += 1
+
+    def get_status(self, job_id):
+        if not job_id in self.records:
+            return None
+        return self.records[job_id]['status']
+
+    def record(self, job_id, name, params, status, outdir, **extra):
+        record = {'job_id': job_id, 'name': name, 'params': params,
+                  'status': status, 'outdir': outdir, 'time': time.time()}
+        record.update(extra)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        self.records[job_id] = record
+        self.n_lines += 1
+
+    # Rewrites the ledger with only the latest record of each job.
+    def compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            for record in self.records.values():
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.path)
+        self.n_lines = len(self.records)
+
+# return: True if the output folder, or the archive of the run in it, contains the output of a finished run
+def has_run_output(outdir):
+    return all(run_archive.has_output(outdir, filename) for filename in RUN_OUTPUT_FILES)
+
+# Returns the jobs that should be (re)run when resuming a campaign, i.e. the
+# jobs that have not succeeded yet. A job recorded as successful whose output
+# folder no longer holds the outputs of a finished run is run again.
+#
+# jobs: an iterable of jobs unpacking as (name, params)
+# get_job_id, get_outdir: functions of (name, params)
+def get_unfinished_jobs(jobs, ledger, get_job_id, get_outdir):
+    for job in jobs:
+        name, params = job
+        if ledger.get_status(get_job_id(name, params)) == SUCCESS:
+            if has_run_output(get_outdir(name, params)):
+                continue
+        yield job
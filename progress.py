@@ -0,0 +1,145 @@
+import collections
+import os
+import threading
+import time
+
+# Keeps the live status of a campaign and periodically rewrites a status file
+# with it.
+#
+# The status is only updated from the events of the scheduler (a job is
+# dispatched, a job finishes), so it costs nothing on the shared filesystem
+# where the runs write their outputs.
+#
+# The ETA is the estimated remaining work, in core-seconds, divided by the
+# core budget. The runtime estimates of the model are scaled by the ratio of
+# the observed to the estimated runtimes of the jobs finished so far.
+class CampaignProgress:
+    def __init__(self, jobs, scheduler, runtime_model, cost_function, status_file, interval = 30):
+        self.scheduler = scheduler
+        self.runtime_model = runtime_model
+        self.cost_function = cost_function
+        self.status_file = status_file
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.counts = collections.defaultdict(collections.Counter)
+        self.queued_work = 0 # estimated core-seconds
+        self.running = {} # job -> (dispatch time, estimated runtime, cores)
+        self.estimated_done = 0
+        self.observed_done = 0
+        for job in jobs:
+            name, params = job
+            self.counts[name]['queued'] += 1
+            self.queued_work += self.get_work(name, params)
+
+        self.stop_event = threading.Event()
+        self.writer = threading.Thread(target = self.write_loop, daemon = True)
+
+    def get_work(self, name, params):
+        cores, _ = self.cost_function(name, params)
+        return cores * self.runtime_model.estimate(name, params)
+
+    def on_dispatch(self, job):
+        name, params = job
+        with self.lock:
+            self.counts[name]['queued'] -= 1
+            self.counts[name]['running'] += 1
+            self.queued_work -= self.get_work(name, params)
+            cores, _ = self.cost_function(name, params)
+            self.running[job] = (time.time(), self.runtime_model.estimate(name, params), cores)
+
+    def on_done(self, job, status, wall_time):
+        name, params = job
+        with self.lock:
+            self.counts[name]['done' if status == 'success' else 'failed'] += 1
+            entry = self.running.pop(job, None)
+            if entry is None: # not dispatched by this launcher
+                return
+            _, estimate, _ = entry
+            self.counts[name]['running'] -= 1
+            self.estimated_done += estimate
+            self.observed_done += wall_time
+
+    # The job has failed and is put back in the queue to be retried.
+    def on_requeue(self, job):
+        name, params = job
+        with self.lock:
+            if self.running.pop(job, None) is not None:
+                self.counts[name]['running'] -= 1
+            self.counts[name]['queued'] += 1
+            self.queued_work += self.get_work(name, params)
+
+    # The job has been submitted to the queue of the launcher daemon.
+    def on_submit(self, job):
+        name, params = job
+        with self.lock:
+            self.counts[name]['queued'] += 1
+            self.queued_work += self.get_work(name, params)
+
+    # The job has been cancelled while queued.
+    def on_cancel(self, job):
+        name, params = job
+        with self.lock:
+            self.counts[name]['queued'] -= 1
+            self.queued_work -= self.get_work(name, params)
+
+    # return: the running jobs
+    def get_running_jobs(self):
+        with self.lock:
+            return list(self.running)
+
+    def get_status(self):
+        with self.lock:
+            now = time.time()
+            elapsed_time = now - self.start_time
+            calibration = self.observed_done / self.estimated_done if self.estimated_done > 0 else 1
+            running_work = sum(cores * max(estimate * calibration - (now - dispatch_time), 0)
+                               for dispatch_time, estimate, cores in self.running.values())
+            remaining_work = self.queued_work * calibration + running_work
+            totals = collections.Counter()
+            lines = ["{:<14} {:>8} {:>8} {:>8} {:>8}".format("benchmark", "queued", "running", "done", "failed")]
+            for name, counts in sorted(self.counts.items()):
+                totals.update(counts)
+                lines.append("{:<14} {:>8} {:>8} {:>8} {:>8}".format(
+                             name, counts['queued'], counts['running'], counts['done'], counts['failed']))
+            lines.append("{:<14} {:>8} {:>8} {:>8} {:>8}".format(
+                         "total", totals['queued'], totals['running'], totals['done'], totals['failed']))
+            finished = totals['done'] + totals['failed']
+            lines.append("")
+            lines.append("cores in use: {}/{} ({:.0f}%)".format(
+                         self.scheduler.used_cores, self.scheduler.cores, 100 * self.scheduler.used_cores / self.scheduler.cores))
+            lines.append("memory in use: {:.1f}/{:.1f} GB".format(self.scheduler.used_memory_gb, self.scheduler.memory_gb))
+            lines.append("elapsed: {}".format(format_duration(elapsed_time)))
+            lines.append("completion rate: {:.2f} jobs/hour".format(finished / elapsed_time * 3600 if elapsed_time > 0 else 0))
+            lines.append("ETA: {}".format(format_duration(remaining_work / self.scheduler.cores)))
+            lines.append("updated: {}".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))))
+            return "\n".join(lines) + "\n"
+
+    def write(self):
+        tmp_path = self.status_file + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.get_status())
+        os.replace(tmp_path, self.status_file)
+
+    def write_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self.write()
+        self.writer.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.writer.join()
+        self.write()
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 24*60*60)
+    hours, seconds = divmod(seconds, 60*60)
+    minutes, seconds = divmod(seconds, 60)
+    if days > 0:
+        return "{}d {:02d}h {:02d}m".format(days, hours, minutes)
+    return "{:02d}h {:02d}m {:02d}s".format(hours, minutes, seconds)
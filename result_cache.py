@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from artifact_cache import md5_file
+from disk_staging import clone_or_copy
+import ledger
+import run_archive
+
+_run_script_hashes = {}
+
+def get_run_script_hash(path):
+    path = os.path.realpath(path)
+    if not path in _run_script_hashes:
+        _run_script_hashes[path] = md5_file(path) if os.path.isfile(path) else None
+    return _run_script_hashes[path]
+
+# Returns the key of the inputs of a gem5 run: the hashes of the artifacts
+# that gem5art records for the run (gem5 binary, gem5 repo, run script repo,
+# kernel and disk image), the hash of the run script itself (its repo may
+# have uncommitted changes) and the params given to the run script.
+#
+# The name of the run (and thus RUN_NAME_SUFFIX), its output folder and the
+# paths of the artifacts are not part of the key, so identical runs of
+# different campaigns have the same key.
+def get_result_key(run):
+    inputs = {
+        'gem5': run.gem5_artifact.hash,
+        'gem5_git': run.gem5_git_artifact.hash,
+        'run_script_git': run.run_script_git_artifact.hash,
+        'linux_binary': run.linux_binary_artifact.hash,
+        'disk_image': run.disk_image_artifact.hash,
+        'run_script': get_run_script_hash(run.run_script),
+        'params': [str(param) for param in run.params]
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys = True).encode()).hexdigest()
+
+# return: True if the info of a gem5art run (its info.json, or its document in the gem5art database) is that of a
+#         run that gem5 finished successfully
+def is_successful_run(info):
+    return info.get('status', None) == "Finished" and not info.get('kill_reason', None) \
+           and info.get('return_code', None) == 0
+
+# return: True if the info.json in the output folder is that of a successful run
+def has_successful_run_info(outdir):
+    try:
+        with run_archive.open_output_text(outdir, "info.json") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return isinstance(info, dict) and is_successful_run(info)
+
+# An index of the successful runs of all the campaigns launched from this
+# folder, by the key of their inputs.
+#
+# Like the ledger, the index is an append-only JSON-lines file, each line
+# mapping a key to the output folder of a successful run; a later line for
+# the same key supersedes the earlier ones.
+class ResultIndex:
+    def __init__(self, path):
+        self.path = path
+        self.records = {} # key -> (outdir, job id)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError: # a partially written line
+                        continue
+                    self.records[record['key']] = (record['outdir'], record.get('job_id', None))
+
+    # An output folder may have been run again since it was indexed, e.g. by a retry or by a later campaign with the
+    # same OUTPUT_FOLDER, so it is only reused if it still holds the outputs of a successful run: its info.json says
+    # so, and the ledger does not record a later failure of the job in that folder.
+    #
+    # return: the output folder of a successful run with the same inputs, or None if there is none
+    def lookup(self, key, completion_ledger = None):
+        outdir, job_id = self.records.get(key, (None, None))
+        if outdir is None or not ledger.has_run_output(outdir) or not has_successful_run_info(outdir):
+            return None
+        if completion_ledger is not None and job_id is not None:
+            record = completion_ledger.records.get(job_id, None)
+            if record is not None and os.path.normpath(record['outdir']) == os.path.normpath(outdir) \
+               and not record['status'] == ledger.SUCCESS:
+                return None
+        return outdir
+
+    def record(self, key, outdir, job_id):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'key': key, 'outdir': str(outdir), 'job_id': job_id, 'time': time.time()}) + "\n")
+        self.records[key] = (str(outdir), job_id)
+
+def copy_output(src, dst):
+    if os.path.lexists(dst): # never write through a file shared with another output folder
+        os.remove(dst)
+    clone_or_copy(src, dst)
+    shutil.copystat(src, dst)
+
+# Puts the outputs of a run into the output folder of another run with the
+# same inputs. The files are copied (as reflinks where the filesystem supports
+# it) rather than hard linked, since gem5 and gem5art rewrite their outputs in
+# place when a run is run again, which would change the outputs of both runs.
+def copy_outputs(src_outdir, dst_outdir):
+    shutil.copytree(src_outdir, dst_outdir, copy_function = copy_output, dirs_exist_ok = True)
@@ -0,0 +1,112 @@
+import io
+import os
+import zipfile
+
+# The archive holding the outputs of a finished run, in its output folder.
+ARCHIVE_NAME = "outputs.zip"
+# The archive of the outputs made by gem5art when the run finished, registered in its database as the results of the run.
+RESULTS_NAME = "results.zip"
+COMPRESSION = zipfile.ZIP_DEFLATED
+COMPRESSION_LEVEL = 6
+
+def get_archive_path(outdir):
+    return os.path.join(outdir, ARCHIVE_NAME)
+
+# return: True if the file or folder of an output folder is left out of its archive, i.e. the archive itself, the
+#         results archive of gem5art, which is already compressed and must stay where its database points to, and the
+#         checkpoints, which gem5 restores from a folder
+def is_unpacked(name):
+    return name == ARCHIVE_NAME or name.startswith(ARCHIVE_NAME + ".") or name == RESULTS_NAME or name.startswith("cpt.")
+
+# Packs the outputs of a finished run into one compressed archive in its
+# output folder, and removes the packed files.
+#
+# Each file is compressed as it is read, so packing never holds a whole
+# output (e.g. a multi-GB stats.txt) in memory. A zip archive keeps an index
+# of its members, so a single member can be read without reading the others.
+# An existing archive (e.g. from an earlier run of the same job) is replaced.
+#
+# return: the number of packed files
+def pack_outdir(outdir):
+    archive_path = get_archive_path(outdir)
+    tmp_path = archive_path + ".tmp"
+    packed_files = []
+    packed_folders = []
+    with zipfile.ZipFile(tmp_path, 'w', compression = COMPRESSION, compresslevel = COMPRESSION_LEVEL) as archive:
+        for root, folders, files in os.walk(outdir):
+            if root == outdir:
+                folders[:] = [folder for folder in folders if not is_unpacked(folder)]
+                files = [name for name in files if not is_unpacked(name)]
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                archive.write(path, os.path.relpath(path, outdir))
+                packed_files.append(path)
+            if not root == outdir:
+                packed_folders.append(root)
+    os.replace(tmp_path, archive_path)
+    for path in packed_files:
+        os.remove(path)
+    for path in reversed(packed_folders): # the subfolders before their parents
+        try:
+            os.rmdir(path)
+        except OSError: # not empty, e.g. written to while packing
+            pass
+    return len(packed_files)
+
+# The functions below read an output file of a run, e.g. "stats.txt", from the
+# output folder if it is there, and from the archive of the run otherwise. A
+# file in the output folder is newer than the archive, e.g. the run has been
+# run again since it was packed.
+
+def get_archive_member(outdir, name):
+    try:
+        with zipfile.ZipFile(get_archive_path(outdir)) as archive:
+            return archive.getinfo(name)
+    except (FileNotFoundError, KeyError):
+        return None
+
+def has_output(outdir, name):
+    return os.path.exists(os.path.join(outdir, name)) or get_archive_member(outdir, name) is not None
+
+# return: (size, mtime in ns) identifying the current version of the output file
+def get_output_signature(outdir, name):
+    path = os.path.join(outdir, name)
+    if os.path.exists(path):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    member = get_archive_member(outdir, name)
+    if member is None:
+        raise FileNotFoundError(path)
+    return member.file_size, os.stat(get_archive_path(outdir)).st_mtime_ns
+
+# return: a binary file object reading the output file, decompressing it on the fly if it is archived
+def open_output(outdir, name):
+    path = os.path.join(outdir, name)
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        pass
+    try:
+        archive = zipfile.ZipFile(get_archive_path(outdir))
+    except FileNotFoundError:
+        raise FileNotFoundError(path)
+    try:
+        member = archive.open(name)
+    except KeyError:
+        archive.close()
+        raise FileNotFoundError(path)
+    return ArchiveMember(archive, member)
+
+# return: a text file object reading the output file
+def open_output_text(outdir, name):
+    return io.TextIOWrapper(open_output(outdir, name), errors = 'replace')
+
+# An archive member that also closes its archive when closed.
+class ArchiveMember(io.BufferedReader):
+    def __init__(self, archive, member):
+        super().__init__(member)
+        self.archive = archive
+
+    def close(self):
+        super().close()
+        self.archive.close()
@@ -0,0 +1,137 @@
+import collections
+import json
+import math
+import os
+import statistics
+import time
+
+# The parameters that determine how long a run takes. Parameters that a
+# benchmark does not have (e.g. spec-2017 has no mem_sys) are left as None.
+RUNTIME_KEY_FIELDS = ['workload', 'cpu', 'num_cpu', 'mem_sys', 'size']
+
+# Default runtime estimates (in seconds) for jobs without any history.
+# They only need to rank the jobs sensibly: detailed cpu models are much
+# slower than KVM, and larger inputs take longer than smaller ones.
+DEFAULT_CPU_RUNTIME = {
+    'kvm': 30*60, # 30 minutes
+    'atomic': 6*60*60, # 6 hours
+    'simple': 6*60*60,
+    'timing': 12*60*60, # 12 hours
+    'o3': 24*60*60 # 1 day
+}
+DEFAULT_SIZE_FACTOR = {
+    'test': 1,
+    'simsmall': 1,
+    'simmedium': 4,
+    'simlarge': 16,
+    'ref': 32,
+    'native': 64
+}
+DEFAULT_BENCHMARK_FACTOR = {
+    'boot-exit': 0.1
+}
+
+# The ratio of the estimates of the longest and shortest jobs that
+# longest_expected_first() may run in any order.
+ORDERING_RESOLUTION = 2 ** 0.25
+
+# A timeout is only learned from at least this many successful past runs.
+MIN_TIMEOUT_SAMPLES = 3
+# The learned timeout is TIMEOUT_MARGIN times the 95th percentile of the past
+# runtimes plus TIMEOUT_SLACK, and at least MIN_TIMEOUT.
+TIMEOUT_MARGIN = 2
+TIMEOUT_SLACK = 60*60 # 1 hour
+MIN_TIMEOUT = 2*60*60 # 2 hours
+
+def runtime_key(name, params):
+    return (name,) + tuple(params.get(field, None) for field in RUNTIME_KEY_FIELDS)
+
+# The key of the same run regardless of its number of cpus and memory system,
+# used when a configuration has never been run before.
+def coarse_runtime_key(name, params):
+    return (name, params.get('workload', None), params['cpu'], params.get('size', None))
+
+def default_runtime_estimate(name, params):
+    estimate = DEFAULT_CPU_RUNTIME.get(params['cpu'], 24*60*60)
+    estimate *= DEFAULT_SIZE_FACTOR.get(params.get('size', None), 1)
+    estimate *= DEFAULT_BENCHMARK_FACTOR.get(name, 1)
+    return estimate
+
+# Runtime model built from the runtimes of past runs.
+#
+# The history is a JSON-lines file, each line recording the benchmark, the
+# params, the status and the wall time (in seconds) of one finished run.
+# Only successful runs are used for estimation. The estimate of a job is the
+# median runtime of the past runs of the same configuration, falling back to
+# the median of the same workload/cpu/size with any num_cpu and mem_sys, and
+# then to `default_runtime_estimate`.
+class RuntimeModel:
+    def __init__(self, history_file):
+        self.history_file = history_file
+        self.samples = collections.defaultdict(list)
+        self.coarse_samples = collections.defaultdict(list)
+        if os.path.exists(history_file):
+            with open(history_file) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError: # a partially written line
+                        continue
+                    self.add_sample(record['name'], record['params'], record['status'], record['wall_time'])
+
+    def add_sample(self, name, params, status, wall_time):
+        if not status == 'success':
+            return
+        self.samples[runtime_key(name, params)].append(wall_time)
+        self.coarse_samples[coarse_runtime_key(name, params)].append(wall_time)
+
+    def get_samples(self, name, params):
+        return self.samples.get(runtime_key(name, params), [])
+
+    def estimate(self, name, params):
+        samples = self.get_samples(name, params)
+        if samples:
+            return statistics.median(samples)
+        samples = self.coarse_samples.get(coarse_runtime_key(name, params), [])
+        if samples:
+            return statistics.median(samples)
+        return default_runtime_estimate(name, params)
+
+    # Returns the timeout of a job learned from the runtimes of the past runs
+    # of the same configuration, or `default_timeout` if there are fewer than
+    # MIN_TIMEOUT_SAMPLES of them. The learned timeout never exceeds
+    # `default_timeout`.
+    def timeout(self, name, params, default_timeout):
+        samples = self.get_samples(name, params)
+        if len(samples) < MIN_TIMEOUT_SAMPLES:
+            return default_timeout
+        percentile_95 = statistics.quantiles(samples, n = 20, method = 'inclusive')[-1]
+        timeout = max(TIMEOUT_MARGIN * percentile_95 + TIMEOUT_SLACK, MIN_TIMEOUT)
+        return min(timeout, default_timeout)
+
+    # Appends a finished run to the history file and to the model.
+    def record(self, name, params, status, wall_time):
+        record = {'name': name, 'params': params, 'status': status,
+                  'wall_time': wall_time, 'time': time.time()}
+        with open(self.history_file, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+        self.add_sample(name, params, status, wall_time)
+
+# Orders the jobs longest-expected-first, so that long runs do not start at
+# the end of a campaign and stretch its makespan.
+#
+# The jobs are not sorted: each job is put in the bucket of its estimate, the
+# buckets growing by a factor of ORDERING_RESOLUTION, and the buckets are
+# yielded from the longest, each in the order of its jobs. An estimate is
+# only a median of past runtimes, so ordering the jobs more finely would not
+# shorten the campaign. Each bucket is released once its jobs are yielded.
+def longest_expected_first(jobs, model):
+    buckets = collections.defaultdict(list)
+    for job in jobs:
+        estimate = max(model.estimate(*job), 1)
+        buckets[math.floor(math.log(estimate, ORDERING_RESOLUTION))].append(job)
+    for bucket in sorted(buckets, reverse = True):
+        yield from buckets.pop(bucket)
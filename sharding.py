@@ -0,0 +1,42 @@
+import argparse
+import heapq
+
+from jobs import job_id
+from job_scheduler import job_cost
+from runtime_model import default_runtime_estimate
+
+# Parses a shard specification "i/N", i.e. shard i (0 <= i < N) of N shards.
+def parse_shard(text):
+    try:
+        index, count = [int(value) for value in text.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard should be of the form i/N, got {}".format(text))
+    if not (count >= 1 and 0 <= index < count):
+        raise argparse.ArgumentTypeError("shard index should be in [0, {}), got {}".format(count, index))
+    return index, count
+
+# The estimated cost of a job in core-seconds.
+#
+# Only the default (history-free) runtime estimate is used, as the runtime
+# history differs from host to host, while every host must compute the same
+# costs to agree on the shards without talking to each other.
+def shard_cost(name, params):
+    cores, _ = job_cost(name, params)
+    return cores * default_runtime_estimate(name, params)
+
+# Splits the jobs into `count` disjoint shards of balanced cost and returns
+# the jobs of shard `index`.
+#
+# The jobs are assigned in decreasing order of cost, each to the shard with
+# the lowest total cost so far (the LPT heuristic). Ties are broken by job id
+# and by shard index, so the assignment only depends on the set of jobs.
+def shard_jobs(jobs, index, count, cost_function = shard_cost):
+    jobs = sorted(jobs, key = lambda job: (-cost_function(*job), job_id(*job)))
+    shard_loads = [(0, shard) for shard in range(count)]
+    shard = []
+    for job in jobs:
+        load, assigned_shard = heapq.heappop(shard_loads)
+        heapq.heappush(shard_loads, (load + cost_function(*job), assigned_shard))
+        if assigned_shard == index:
+            shard.append(job)
+    return shard
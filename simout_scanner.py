@@ -0,0 +1,58 @@
+import os
+
+READ_CHUNK_SIZE = 1 << 20 # 1 MiB
+
+# Incrementally searches a growing file (e.g. `simout`) for a phrase.
+#
+# The scanner remembers the byte offset up to which the file has been read,
+# so every call to `scan()` only reads the bytes appended since the previous
+# call. The last len(phrase) - 1 bytes of the previous read are kept so that a
+# phrase split across two reads is still found. Once the phrase has been
+# found, the result is cached and the file is never read again.
+class PhraseScanner:
+    def __init__(self, path, phrase):
+        self.path = path
+        self.phrase = phrase.encode()
+        self.offset = 0
+        self.tail = b''
+        self.found = False
+
+    # return: True if the phrase appears in the file, False otherwise
+    def scan(self):
+        if self.found:
+            return True
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError: # gem5 has not created the file yet
+            return False
+        with f:
+            if os.fstat(f.fileno()).st_size < self.offset: # the file was truncated
+                self.offset = 0
+                self.tail = b''
+            f.seek(self.offset)
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.offset += len(chunk)
+                data = self.tail + chunk
+                if self.phrase in data:
+                    self.found = True
+                    self.tail = b''
+                    return True
+                self.tail = data[max(0, len(data) - len(self.phrase) + 1):]
+        return False
+
+# One scanner per (file, phrase), so that each run is scanned from where the
+# previous check stopped.
+_scanners = {}
+
+def get_scanner(path, phrase):
+    key = (str(path), phrase)
+    if not key in _scanners:
+        _scanners[key] = PhraseScanner(path, phrase)
+    return _scanners[key]
+
+def forget_scanners(path):
+    for key in [key for key in _scanners if key[0] == str(path)]:
+        del _scanners[key]
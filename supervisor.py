@@ -0,0 +1,135 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+CHECK_INTERVAL = 5 # seconds, as gem5Run.run()
+
+# One check of a running run, as done by gem5Run.run(): samples gem5, checks
+# the timeout and the `check_failure` function of the run, and writes
+# info.json.
+#
+# return: the reason to kill gem5, or None
+def check_run(run, pid, on_sample):
+    run.status = "Running"
+    run.current_time = time.time()
+    run.pid = pid
+    run.running = True
+    if on_sample is not None:
+        on_sample(pid)
+    if run.current_time - run.start_time > run.timeout:
+        run.kill_reason = 'timeout'
+    elif run.check_failure(run):
+        run.kill_reason = 'failure'
+    run.dumpJson('info.json')
+    return getattr(run, 'kill_reason', None)
+
+# Runs a gem5art run as gem5Run.run() does, but as a coroutine: gem5 is
+# started as a child process of the event loop, and the timeout and the
+# `check_failure` function of the run are checked every `interval` seconds
+# without blocking the loop. Everything reading or writing files (the checks,
+# info.json) or the database, and the zipping of the results by gem5art, is
+# done in the default executor of the loop, which only waits for gem5.
+#
+# on_sample: called with the pid of gem5 at every check, e.g. to sample its resource usage.
+async def supervise_run(run, interval = CHECK_INTERVAL, on_sample = None, cwd = '.'):
+    from gem5art import artifact
+
+    loop = asyncio.get_running_loop()
+    dump = lambda: loop.run_in_executor(None, run.dumpJson, 'info.json')
+    db = await loop.run_in_executor(None, artifact.getDBConnection)
+    if await loop.run_in_executor(None, lambda: run.hash in db):
+        print("Error: Have already run {}. Exiting!".format(run.command))
+        return
+
+    run.status = "Begin run"
+    await dump()
+    if not await loop.run_in_executor(None, run.checkArtifacts, cwd):
+        await dump()
+        return
+
+    run.status = "Spawning"
+    run.start_time = time.time()
+    run.current_time = run.start_time
+    run.task_id = None
+    await dump()
+
+    proc = await asyncio.create_subprocess_exec(*[str(arg) for arg in run.command], cwd = cwd)
+    try:
+        while proc.returncode is None:
+            if await loop.run_in_executor(None, check_run, run, proc.pid, on_sample) is not None:
+                proc.kill()
+            try:
+                await asyncio.wait_for(proc.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+    except asyncio.CancelledError: # the supervisor is shutting down
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        run.kill_reason = 'sigterm'
+        run.dumpJson('info.json')
+        raise
+
+    print("Done running {}".format(' '.join(str(arg) for arg in run.command)))
+    run.running = False
+    run.end_time = time.time()
+    run.return_code = proc.returncode
+    run.status = "Finished" if run.return_code == 0 else "Failed"
+    await dump()
+
+    await loop.run_in_executor(None, run.saveResults)
+    await loop.run_in_executor(None, db.put, run._id, run._getSerializable())
+    print("Done storing the results of {}".format(' '.join(str(arg) for arg in run.command)))
+
+# Runs coroutines in an event loop running in its own thread, with the
+# `apply_async()` interface of multiprocessing.Pool, so that JobScheduler can
+# dispatch the jobs to it instead of to a pool of worker processes.
+#
+# All the runs share the launcher process: the artifacts and the database
+# client are loaded once, and each running simulation only costs a gem5
+# process and a coroutine.
+#
+# executor_workers: number of threads for the blocking work of the runs
+#                   (database accesses, zipping the results, staging disk images).
+class RunSupervisor:
+    def __init__(self, executor_workers = 32):
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(executor_workers))
+        self.thread = threading.Thread(target = self.loop.run_forever, daemon = True)
+        self.tasks = set()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        return False
+
+    # Kills the runs still running, e.g. when the launcher is interrupted.
+    async def shutdown(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions = True)
+        await self.loop.shutdown_default_executor()
+
+    # Runs the coroutine function `function` with `args` in the event loop.
+    def apply_async(self, function, args = (), callback = None, error_callback = None):
+        def run():
+            task = self.loop.create_task(function(*args))
+            self.tasks.add(task)
+            task.add_done_callback(done)
+        def done(task):
+            self.tasks.discard(task)
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                if error_callback is not None:
+                    error_callback(task.exception())
+            elif callback is not None:
+                callback(task.result())
+        self.loop.call_soon_threadsafe(run)
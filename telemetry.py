@@ -0,0 +1,164 @@
+import json
+import os
+import resource
+import threading
+import time
+
+SAMPLING_INTERVAL = 5 # seconds
+
+# return: the pids of the child processes of the process `pid`
+def get_child_pids(pid):
+    children = []
+    try:
+        for tid in os.listdir("/proc/{}/task".format(pid)):
+            with open("/proc/{}/task/{}/children".format(pid, tid)) as f:
+                children.extend(int(child) for child in f.read().split())
+        return children
+    except OSError: # kernels without CONFIG_PROC_CHILDREN
+        pass
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as f:
+                # the command may contain spaces, the ppid is the second field after it
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+# return: the peak resident set size (VmHWM) of the process in bytes, or None
+def read_peak_rss(pid):
+    try:
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+# return: the I/O counters of the process (rchar, wchar, read_bytes, write_bytes, ...), or an empty dict
+def read_io_counters(pid):
+    counters = {}
+    try:
+        with open("/proc/{}/io".format(pid)) as f:
+            for line in f:
+                name, value = line.split(':')
+                counters[name] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters
+
+# Measures the host resources used by the child processes (i.e. gem5) that
+# this process spawns within a `with` block.
+#
+# CPU times and block I/O come from the rusage of the terminated children,
+# which is exact. The peak RSS and the character I/O (which, unlike block
+# I/O, includes reads and writes over NFS) are only available while a child
+# is alive, so a thread samples them from /proc every `interval` seconds.
+# The peak RSS is None if the child exited before it was sampled: the rusage
+# peak is over every child the process has reaped, e.g. the gem5 processes of
+# the earlier runs of a pool worker.
+class RunTelemetry:
+    def __init__(self, interval = SAMPLING_INTERVAL):
+        self.interval = interval
+        self.peak_rss = {}
+        self.io_counters = {}
+        self.stop_event = threading.Event()
+        self.sampler = threading.Thread(target = self.sample_loop, daemon = True)
+        self.record = None
+
+    def sample(self):
+        for pid in get_child_pids(os.getpid()):
+            peak_rss = read_peak_rss(pid)
+            if peak_rss is not None:
+                self.peak_rss[pid] = max(self.peak_rss.get(pid, 0), peak_rss)
+            io_counters = read_io_counters(pid)
+            if io_counters:
+                self.io_counters[pid] = io_counters
+
+    def sample_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.start_time = time.time()
+        self.start_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.stop_event.set()
+        self.sampler.join()
+        end_time = time.time()
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        peak_rss = max(self.peak_rss.values()) if self.peak_rss else None
+        self.record = {
+            'wall_time': end_time - self.start_time,
+            'user_time': usage.ru_utime - self.start_usage.ru_utime,
+            'system_time': usage.ru_stime - self.start_usage.ru_stime,
+            'peak_rss_bytes': peak_rss,
+            'read_bytes': (usage.ru_inblock - self.start_usage.ru_inblock) * 512,
+            'write_bytes': (usage.ru_oublock - self.start_usage.ru_oublock) * 512,
+            'read_chars': sum(counters.get('rchar', 0) for counters in self.io_counters.values()),
+            'write_chars': sum(counters.get('wchar', 0) for counters in self.io_counters.values())
+        }
+        return False
+
+    def save(self, outdir):
+        with open(os.path.join(outdir, "telemetry.json"), 'w') as f:
+            json.dump(self.record, f, indent = 2)
+
+# return: the (user, system) CPU times of the process in seconds, or None
+def read_cpu_times(pid):
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        # utime and stime are the 14th and 15th fields, i.e. the 12th and 13th after the command
+        return int(fields[11]) / ticks, int(fields[12]) / ticks
+    except (OSError, IndexError, ValueError):
+        return None
+
+# Measures the host resources used by one child process, for a launcher
+# running many gem5 processes at once (see supervisor.py), where the rusage
+# of the terminated children mixes all the runs.
+#
+# All the counters are sampled from /proc by calling `sample()` while the
+# process is alive, so they miss at most the last sampling interval.
+class ProcessTelemetry:
+    def __init__(self):
+        self.cpu_times = (0, 0)
+        self.peak_rss = None # not sampled yet
+        self.io_counters = {}
+        self.record = None
+
+    def sample(self, pid):
+        cpu_times = read_cpu_times(pid)
+        if cpu_times is not None:
+            self.cpu_times = cpu_times
+        peak_rss = read_peak_rss(pid)
+        if peak_rss is not None:
+            self.peak_rss = max(self.peak_rss or 0, peak_rss)
+        io_counters = read_io_counters(pid)
+        if io_counters:
+            self.io_counters = io_counters
+
+    def finish(self, wall_time):
+        self.record = {
+            'wall_time': wall_time,
+            'user_time': self.cpu_times[0],
+            'system_time': self.cpu_times[1],
+            'peak_rss_bytes': self.peak_rss,
+            'read_bytes': self.io_counters.get('read_bytes', 0),
+            'write_bytes': self.io_counters.get('write_bytes', 0),
+            'read_chars': self.io_counters.get('rchar', 0),
+            'write_chars': self.io_counters.get('wchar', 0)
+        }
+
+    def save(self, outdir):
+        with open(os.path.join(outdir, "telemetry.json"), 'w') as f:
+            json.dump(self.record, f, indent = 2)
@@ -0,0 +1,37 @@
+import itertools
+
+from filter_logic import Constraint, check_constraints, constrained_product
+
+FIELDS = ['cpu', 'mem_sys', 'num_cpu']
+DOMAINS = [['atomic', 'timing', 'o3'], ['classic', 'MESI_Two_Level'], ['1', '2', '4']]
+
+def sorted_items(params):
+    return sorted(params.items())
+
+def atomic_filter(params):
+    return not (params['cpu'] == 'atomic' and not params['mem_sys'] == 'classic')
+
+def num_cpu_filter(params):
+    return params['num_cpu'] == '1' or params['cpu'] == 'o3'
+
+def test_constrained_product_is_the_filtered_cross_product():
+    constraints = [Constraint(['cpu', 'mem_sys'], atomic_filter), Constraint(['num_cpu', 'cpu'], num_cpu_filter)]
+    expected = [dict(zip(FIELDS, values)) for values in itertools.product(*DOMAINS)]
+    expected = [params for params in expected if check_constraints(constraints, params)]
+    product = list(constrained_product(FIELDS, DOMAINS, constraints))
+    assert sorted(map(sorted_items, product)) == sorted(map(sorted_items, expected))
+    assert all(list(params) == FIELDS for params in product)
+
+def test_constrained_product_prunes_rejected_combinations():
+    calls = []
+    def reject_atomic(params):
+        calls.append(dict(params))
+        return not params['cpu'] == 'atomic'
+    # the fields of the constraint are set first, and the constraint is checked once per value of 'cpu'
+    product = list(constrained_product(FIELDS, DOMAINS, [Constraint(['cpu'], reject_atomic)]))
+    assert len(product) == 2 * 2 * 3
+    assert calls == [{'cpu': 'atomic'}, {'cpu': 'timing'}, {'cpu': 'o3'}]
+
+def test_constraints_on_other_fields_do_not_apply():
+    constraints = [Constraint(['cpu', 'size'], lambda params: False)]
+    assert len(list(constrained_product(FIELDS, DOMAINS, constraints))) == 3 * 2 * 3
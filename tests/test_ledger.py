@@ -0,0 +1,47 @@
+from ledger import CompletionLedger, SUCCESS, FAILURE
+
+def count_lines(path):
+    with open(path) as f:
+        return sum(1 for line in f if line.strip())
+
+def test_later_records_supersede_earlier_ones(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = CompletionLedger(path)
+    ledger.record("a", "npb", {}, FAILURE, "/out/a", failure_class = "transient")
+    ledger.record("a", "npb", {}, SUCCESS, "/out/a")
+    ledger.record("b", "npb", {}, FAILURE, "/out/b")
+    assert ledger.get_status("a") == SUCCESS
+    assert ledger.get_status("c") is None
+
+    reloaded = CompletionLedger(path)
+    assert reloaded.n_lines == 3
+    assert reloaded.get_status("a") == SUCCESS
+    assert reloaded.get_status("b") == FAILURE
+
+def test_compact_keeps_the_latest_record_of_each_job(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = CompletionLedger(path)
+    for status in [FAILURE, FAILURE, SUCCESS]:
+        ledger.record("a", "npb", {}, status, "/out/a")
+    ledger.record("b", "npb", {}, FAILURE, "/out/b", failure_class = "deterministic")
+
+    ledger.compact()
+    assert ledger.n_lines == 2
+    assert count_lines(path) == 2
+    reloaded = CompletionLedger(path)
+    assert reloaded.records == ledger.records
+    assert reloaded.records["b"]['failure_class'] == "deterministic"
+
+    ledger.record("b", "npb", {}, SUCCESS, "/out/b")
+    assert CompletionLedger(path).get_status("b") == SUCCESS
+
+def test_a_partially_written_line_is_skipped(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = CompletionLedger(path)
+    ledger.record("a", "npb", {}, SUCCESS, "/out/a")
+    with open(path, 'a') as f:
+        f.write('{"job_id": "b", "sta')
+
+    reloaded = CompletionLedger(path)
+    assert reloaded.n_lines == 1
+    assert reloaded.get_status("b") is None
@@ -0,0 +1,43 @@
+import os
+
+import run_archive
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, 'w') as f:
+        f.write(content)
+
+def read_output(outdir, name):
+    with run_archive.open_output_text(outdir, name) as f:
+        return f.read()
+
+def test_pack_outdir_packs_the_outputs(tmp_path):
+    outdir = str(tmp_path)
+    write_file(os.path.join(outdir, "stats.txt"), "simSeconds 1.0\n")
+    write_file(os.path.join(outdir, "system.pc.com_1.device"), "Done booting Linux\n")
+    write_file(os.path.join(outdir, "m5out", "config.ini"), "[root]\n")
+
+    assert run_archive.pack_outdir(outdir) == 3
+    assert sorted(os.listdir(outdir)) == [run_archive.ARCHIVE_NAME]
+    assert read_output(outdir, "stats.txt") == "simSeconds 1.0\n"
+    assert read_output(outdir, "m5out/config.ini") == "[root]\n"
+
+def test_pack_outdir_leaves_the_gem5art_results_and_the_checkpoints(tmp_path):
+    outdir = str(tmp_path)
+    write_file(os.path.join(outdir, "stats.txt"), "simSeconds 1.0\n")
+    write_file(os.path.join(outdir, run_archive.RESULTS_NAME), "zipped by gem5art")
+    write_file(os.path.join(outdir, "cpt.1000", "m5.cpt"), "checkpoint")
+
+    assert run_archive.pack_outdir(outdir) == 1
+    with open(os.path.join(outdir, run_archive.RESULTS_NAME)) as f:
+        assert f.read() == "zipped by gem5art"
+    assert os.path.isfile(os.path.join(outdir, "cpt.1000", "m5.cpt"))
+    assert run_archive.get_archive_member(outdir, run_archive.RESULTS_NAME) is None
+
+def test_output_folder_file_is_newer_than_the_archive(tmp_path):
+    outdir = str(tmp_path)
+    write_file(os.path.join(outdir, "stats.txt"), "packed\n")
+    run_archive.pack_outdir(outdir)
+    write_file(os.path.join(outdir, "stats.txt"), "run again\n")
+
+    assert read_output(outdir, "stats.txt") == "run again\n"
@@ -0,0 +1,34 @@
+import argparse
+
+import pytest
+
+from sharding import parse_shard, shard_jobs
+
+def make_jobs(n_jobs):
+    return [('sim', {'index': str(index)}) for index in range(n_jobs)]
+
+def job_cost(name, params):
+    return 1 + int(params['index']) % 7
+
+def test_parse_shard():
+    assert parse_shard("0/1") == (0, 1)
+    assert parse_shard("3/4") == (3, 4)
+    for text in ["4/4", "-1/4", "0/0", "1", "a/b", "1/2/3"]:
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(text)
+
+def test_shards_are_disjoint_and_cover_the_jobs():
+    jobs = make_jobs(100)
+    shards = [shard_jobs(jobs, index, 4, job_cost) for index in range(4)]
+    sharded = [params['index'] for shard in shards for _, params in shard]
+    assert sorted(sharded) == sorted(params['index'] for _, params in jobs)
+
+def test_shards_do_not_depend_on_the_order_of_the_jobs():
+    jobs = make_jobs(100)
+    for index in range(3):
+        assert shard_jobs(jobs, index, 3, job_cost) == shard_jobs(jobs[::-1], index, 3, job_cost)
+
+def test_shards_are_balanced():
+    jobs = make_jobs(100)
+    loads = [sum(job_cost(*job) for job in shard_jobs(jobs, index, 4, job_cost)) for index in range(4)]
+    assert max(loads) - min(loads) <= max(job_cost(*job) for job in jobs)
@@ -0,0 +1,112 @@
+import json
+import multiprocessing as mp
+import os
+import signal
+import time
+
+import pytest
+
+from jobs import JobSpec
+from work_queue import WorkQueue, simulate_host, LEASE_SUFFIX
+
+N_JOBS = 200
+LEASE_TIME = 1 # seconds
+JOB_TIME = 0.01 # seconds
+
+# A host that claims `n_jobs` jobs, keeps their leases alive, and never runs them, until it is killed.
+def hold_jobs(folder, n_jobs, claimed_path):
+    queue = WorkQueue(folder, "holder", LEASE_TIME)
+    queue.start()
+    claimed = []
+    for job in queue.claim_jobs():
+        claimed.append(job.id)
+        if len(claimed) == n_jobs:
+            break
+    with open(claimed_path, 'w') as f:
+        json.dump(claimed, f)
+    while True:
+        time.sleep(1)
+
+def read_runs(folder):
+    runs = {}
+    for name in os.listdir(folder):
+        if name.startswith("done."):
+            with open(os.path.join(folder, name)) as f:
+                for line in f:
+                    job_id = json.loads(line)['job_id']
+                    runs[job_id] = runs.get(job_id, 0) + 1
+    return runs
+
+def wait_for(path, timeout):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        if time.time() > deadline:
+            raise TimeoutError("{} was not written".format(path))
+        time.sleep(0.05)
+
+@pytest.fixture
+def queue_folder(tmp_path):
+    folder = str(tmp_path / "queue")
+    jobs = [JobSpec.from_params('sim', {'index': str(index)}) for index in range(N_JOBS)]
+    assert WorkQueue(folder, 'launcher').populate(jobs)
+    assert not WorkQueue(folder, 'launcher').populate(jobs)
+    return folder, jobs
+
+def test_hosts_run_every_job_once_and_reclaim_the_jobs_of_a_killed_host(queue_folder, tmp_path):
+    folder, jobs = queue_folder
+    claimed_path = str(tmp_path / "claimed.json")
+    holder = mp.Process(target = hold_jobs, args = (folder, 5, claimed_path))
+    holder.start()
+    wait_for(claimed_path, timeout = 30)
+    with open(claimed_path) as f:
+        held_jobs = json.load(f)
+
+    hosts = [mp.Process(target = simulate_host, args = (folder, "host{}".format(index), slots, JOB_TIME, LEASE_TIME))
+             for index, slots in enumerate([1, 2, 4])]
+    for host in hosts:
+        host.start()
+    # the holder dies with the leases of its jobs, which the other hosts reclaim once they have expired
+    time.sleep(LEASE_TIME / 2)
+    os.kill(holder.pid, signal.SIGKILL)
+    holder.join()
+    for host in hosts:
+        host.join(timeout = 60)
+        assert host.exitcode == 0
+
+    runs = read_runs(folder)
+    assert set(runs) == {job.id for job in jobs}
+    assert all(count == 1 for count in runs.values())
+    assert all(job_id in runs for job_id in held_jobs)
+    assert os.listdir(os.path.join(folder, "jobs")) == []
+    assert [name for name in os.listdir(os.path.join(folder, "leases")) if name.endswith(LEASE_SUFFIX)] == []
+
+def test_a_host_that_dies_while_running_jobs(queue_folder):
+    folder, jobs = queue_folder
+    # host0 exits, without releasing its leases, when it starts its third job
+    hosts = [mp.Process(target = simulate_host, args = (folder, "host{}".format(index), slots, 5 * JOB_TIME, LEASE_TIME, die_after))
+             for index, (slots, die_after) in enumerate([(1, 2), (2, None), (4, None)])]
+    for host in hosts:
+        host.start()
+    for host in hosts:
+        host.join(timeout = 60)
+    assert [host.exitcode for host in hosts] == [1, 0, 0]
+
+    # a job host0 recorded as done right before exiting may be run again, as host0 did not complete it in the queue
+    runs = read_runs(folder)
+    assert set(runs) == {job.id for job in jobs}
+    assert os.listdir(os.path.join(folder, "jobs")) == []
+
+def test_claimed_jobs_are_not_claimed_again(queue_folder):
+    folder, jobs = queue_folder
+    first = WorkQueue(folder, "first", LEASE_TIME)
+    second = WorkQueue(folder, "second", LEASE_TIME)
+    index = first.list_unclaimed()[0]
+
+    job = first.try_claim(index)
+    assert job == jobs[0]
+    assert second.try_claim(index) is None
+    assert not index in second.list_unclaimed()
+
+    first.complete(job)
+    assert second.try_claim(index) is None
+    assert not index in first.list_jobs()
@@ -0,0 +1,319 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from jobs import JobSpec
+from job_scheduler import JobScheduler
+
+LEASE_TIME = 10 * 60 # seconds without a heartbeat after which the lease of a job expires
+MIN_CLAIM_WAIT = 0.1 # seconds between two checks of a queue with only leased jobs
+JOB_SUFFIX = ".json"
+LEASE_SUFFIX = ".lease"
+
+# A queue of jobs on a filesystem shared by several hosts (e.g. the NFS mount
+# of OUTPUT_FOLDER), from which the launchers of all the hosts pull jobs as
+# they have room for them, so that every host keeps busy until the queue is
+# empty whatever its size.
+#
+# The queue is a folder with a file per queued job, `jobs/<index>.json`,
+# numbered in the order the jobs should be run, and a lease file per claimed
+# job, `leases/<index>.lease`. There is no lock:
+#  - a host claims a job by hard linking a lease file it has written to
+#    `leases/<index>.lease`, which fails if another host holds the lease
+#    (link(2) is atomic, also on NFS);
+#  - the host holding a lease touches it every `lease_time / 4` seconds;
+#  - a lease that has not been touched for `lease_time` seconds, e.g. its host
+#    has died, has expired: any host can rename it away, which only one host
+#    succeeds in doing, and the job can be claimed again; a host with no job
+#    left to claim keeps watching the leases of the other hosts until their
+#    jobs have finished;
+#  - a host removes the job file, then the lease file, once the job has finished.
+#
+# A host that has lost a lease (e.g. it was suspended for longer than
+# `lease_time`) finishes the run of the job anyway; the job may then run
+# twice, into the same output folder. The mtimes of the leases are set by the
+# file server and compared with the clock of the host, so `lease_time` must
+# be much longer than the clock skew between the hosts.
+class WorkQueue:
+    def __init__(self, folder, host = None, lease_time = LEASE_TIME):
+        self.folder = folder
+        self.host = host if host is not None else socket.gethostname()
+        self.lease_time = lease_time
+        self.jobs_folder = os.path.join(folder, "jobs")
+        self.leases_folder = os.path.join(folder, "leases")
+        self.lock = threading.Lock()
+        self.claimed = {} # job -> (index, inode of its lease)
+        self.stop_event = threading.Event()
+        self.heartbeat_thread = threading.Thread(target = self.heartbeat_loop, daemon = True)
+
+    def get_job_path(self, index):
+        return os.path.join(self.jobs_folder, index + JOB_SUFFIX)
+
+    def get_lease_path(self, index):
+        return os.path.join(self.leases_folder, index + LEASE_SUFFIX)
+
+    def get_tmp_suffix(self):
+        return ".{}.{}.{}.tmp".format(self.host, os.getpid(), threading.get_ident())
+
+    # Creates the queue with `jobs`, in order, unless it already exists, e.g. it has been created by another host or
+    # by an earlier launch of the campaign.
+    #
+    # return: True if the queue has been created
+    def populate(self, jobs):
+        if os.path.isdir(self.jobs_folder):
+            return False
+        os.makedirs(self.leases_folder, exist_ok = True)
+        tmp_folder = self.jobs_folder + self.get_tmp_suffix()
+        os.makedirs(tmp_folder)
+        for index, job in enumerate(jobs):
+            name, params = job
+            with open(os.path.join(tmp_folder, "{:08d}{}".format(index, JOB_SUFFIX)), 'w') as f:
+                json.dump({'name': name, 'params': params}, f)
+        try:
+            os.rename(tmp_folder, self.jobs_folder)
+        except OSError: # created by another host in the meantime
+            shutil.rmtree(tmp_folder)
+            return False
+        return True
+
+    # return: the indices of the queued jobs that no host holds the lease of, in order
+    def list_unclaimed(self):
+        leased = {name[:-len(LEASE_SUFFIX)] for name in os.listdir(self.leases_folder) if name.endswith(LEASE_SUFFIX)}
+        return sorted(self.list_jobs() - leased)
+
+    # return: the job, or None if another host holds its lease or it has finished
+    def try_claim(self, index):
+        lease_path = self.get_lease_path(index)
+        tmp_path = lease_path + self.get_tmp_suffix()
+        with open(tmp_path, 'w') as f:
+            json.dump({'host': self.host, 'pid': os.getpid(), 'time': time.time()}, f)
+        try:
+            try:
+                os.link(tmp_path, lease_path)
+            except FileExistsError:
+                return None
+            except OSError: # on NFS, the reply to a successful link() may be lost
+                if not os.stat(tmp_path).st_nlink == 2:
+                    return None
+            inode = os.stat(tmp_path).st_ino
+        finally:
+            os.remove(tmp_path)
+        try:
+            with open(self.get_job_path(index)) as f:
+                record = json.load(f)
+        except FileNotFoundError: # finished since the queue was listed
+            os.remove(lease_path)
+            return None
+        job = JobSpec.from_params(record['name'], record['params'])
+        with self.lock:
+            self.claimed[job] = (index, inode)
+        return job
+
+    # Removes the leases that have expired.
+    #
+    # return: the number of removed leases
+    def reclaim_expired(self):
+        n_reclaimed = 0
+        now = time.time()
+        for name in os.listdir(self.leases_folder):
+            if not name.endswith(LEASE_SUFFIX):
+                if name.endswith(".tmp") and self.is_expired(os.path.join(self.leases_folder, name), now):
+                    self.remove(os.path.join(self.leases_folder, name)) # left over by a host killed while claiming
+                continue
+            lease_path = os.path.join(self.leases_folder, name)
+            if not self.is_expired(lease_path, now):
+                continue
+            expired_path = lease_path + self.get_tmp_suffix()
+            try:
+                os.rename(lease_path, expired_path)
+            except FileNotFoundError: # reclaimed by another host, or the job has finished
+                continue
+            os.remove(expired_path)
+            n_reclaimed += 1
+            print("Reclaimed the expired lease of job {}".format(name[:-len(LEASE_SUFFIX)]))
+        return n_reclaimed
+
+    def is_expired(self, path, now):
+        try:
+            return now - os.stat(path).st_mtime > self.lease_time
+        except FileNotFoundError:
+            return False
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # return: the indices of all the jobs still in the queue, claimed or not
+    def list_jobs(self):
+        return {name[:-len(JOB_SUFFIX)] for name in os.listdir(self.jobs_folder) if name.endswith(JOB_SUFFIX)}
+
+    # return: the time (in seconds) until the earliest lease expires, or None if there is no lease
+    def get_time_to_expiry(self):
+        now = time.time()
+        mtimes = []
+        for name in os.listdir(self.leases_folder):
+            if name.endswith(LEASE_SUFFIX):
+                try:
+                    mtimes.append(os.stat(os.path.join(self.leases_folder, name)).st_mtime)
+                except FileNotFoundError:
+                    pass
+        return min(mtimes) + self.lease_time - now if mtimes else None
+
+    # Claims the queued jobs one at a time, as they are pulled from the iterator. When no job is left to claim but
+    # other hosts hold the leases of some jobs, waits for these jobs to finish or for their leases to expire, and
+    # reclaims the expired leases; the iterator ends once every job left in the queue has been claimed by this host.
+    #
+    # on_claim: called with each claimed job.
+    def claim_jobs(self, on_claim = None):
+        while True:
+            claimed = False
+            for index in self.list_unclaimed():
+                job = self.try_claim(index)
+                if job is None:
+                    continue
+                claimed = True
+                if on_claim is not None:
+                    on_claim(job)
+                yield job
+            if claimed:
+                continue
+            with self.lock:
+                own_jobs = {index for index, _ in self.claimed.values()}
+            if self.list_jobs() <= own_jobs:
+                return
+            if self.reclaim_expired() > 0:
+                continue
+            # check again when the earliest lease expires, or sooner, to see the jobs finished by other hosts
+            time_to_expiry = self.get_time_to_expiry()
+            wait_time = self.lease_time / 4 if time_to_expiry is None else min(time_to_expiry, self.lease_time / 4)
+            if self.stop_event.wait(max(wait_time, MIN_CLAIM_WAIT)):
+                return
+
+    # return: True if the lease of the job is still the one this host has written
+    def holds_lease(self, job):
+        with self.lock:
+            index, inode = self.claimed[job]
+        try:
+            return os.stat(self.get_lease_path(index)).st_ino == inode
+        except FileNotFoundError:
+            return False
+
+    # Removes the job from the queue once it has finished.
+    def complete(self, job):
+        with self.lock:
+            index, _ = self.claimed[job]
+        holds_lease = self.holds_lease(job)
+        self.remove(self.get_job_path(index))
+        if holds_lease:
+            self.remove(self.get_lease_path(index))
+        with self.lock:
+            del self.claimed[job]
+
+    def heartbeat(self):
+        with self.lock:
+            claimed = list(self.claimed.items())
+        for job, (index, _) in claimed:
+            if not self.holds_lease(job):
+                print("Lost the lease of job {} ({})".format(index, job.id))
+                continue
+            try:
+                os.utime(self.get_lease_path(index))
+            except FileNotFoundError:
+                pass
+
+    def heartbeat_loop(self):
+        while not self.stop_event.wait(self.lease_time / 4):
+            self.heartbeat()
+
+    def start(self):
+        self.heartbeat_thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.heartbeat_thread.join()
+
+# A simulated host of the simulation below: pulls the jobs of the queue with JobScheduler, as the launcher does, and
+# runs them `slots` at a time, each taking about `job_time` seconds, and records them in `<folder>/done.<host>.jsonl`.
+# A host with `die_after` set exits without finishing its jobs, and without releasing their leases, when it starts
+# its `die_after + 1`-th job, as a crashed host would.
+def simulate_host(folder, host, slots, job_time, lease_time, die_after = None):
+    queue = WorkQueue(folder, host, lease_time)
+    done_lock = threading.Lock()
+    rng = random.Random(host)
+    n_started = 0
+    def run(job):
+        time.sleep(job_time * rng.uniform(0.5, 1.5))
+        return job.id
+    def on_dispatch(job):
+        nonlocal n_started
+        n_started += 1
+        if die_after is not None and n_started > die_after:
+            os._exit(1)
+    def on_done(job, job_id):
+        with done_lock, open(os.path.join(folder, "done.{}.jsonl".format(host)), 'a') as f:
+            f.write(json.dumps({'job_id': job_id, 'time': time.time()}) + "\n")
+        queue.complete(job)
+    queue.start()
+    with ThreadPool(slots) as pool:
+        scheduler = JobScheduler(pool, run, slots, slots, cost_function = lambda name, params: (1, 1),
+                                 lookahead = 4, on_dispatch = on_dispatch, on_done = on_done)
+        scheduler.run(queue.claim_jobs())
+    queue.stop()
+
+# Runs a queue of `n_jobs` jobs on simulated hosts, one local process per host, and checks that every job has been
+# run, e.g.
+#   python3 work_queue.py /tmp/queue --jobs 2000 --slots 1 2 4 8 --job-time 0.05 --lease-time 2 --kill 0
+if __name__ == "__main__":
+    import multiprocessing as mp
+
+    parser = argparse.ArgumentParser(description='Simulate several hosts sharing a work queue.')
+    parser.add_argument('folder', help='folder of the queue, removed first')
+    parser.add_argument('--jobs', type=int, default = 1000, help='number of jobs')
+    parser.add_argument('--slots', type=int, nargs='+', default = [1, 2, 4, 8],
+                        help='number of jobs each simulated host runs at the same time')
+    parser.add_argument('--job-time', type=float, default = 0.05, help='mean runtime (in seconds) of a job')
+    parser.add_argument('--lease-time', type=float, default = 2)
+    parser.add_argument('--kill', type=int, nargs='*', default = [], metavar='HOST',
+                        help='hosts (indices in --slots) that die after having started a few jobs')
+    args = parser.parse_args()
+    if len(set(args.kill)) >= len(args.slots):
+        parser.error("at least one host must survive")
+
+    shutil.rmtree(args.folder, ignore_errors = True)
+    jobs = [JobSpec.from_params('sim', {'index': str(index)}) for index in range(args.jobs)]
+    WorkQueue(args.folder, 'launcher').populate(jobs)
+
+    start_time = time.time()
+    hosts = []
+    for index, slots in enumerate(args.slots):
+        host = "host{}".format(index)
+        die_after = 2 * slots if index in args.kill else None
+        process = mp.Process(target = simulate_host, args = (args.folder, host, slots, args.job_time, args.lease_time, die_after))
+        process.start()
+        hosts.append((host, slots, process))
+    # the jobs of the dead hosts are reclaimed by the hosts still running once their leases have expired
+    for _, _, process in hosts:
+        process.join()
+
+    runs = {}
+    for host, slots, _ in hosts:
+        path = os.path.join(args.folder, "done.{}.jsonl".format(host))
+        records = [json.loads(line) for line in open(path)] if os.path.exists(path) else []
+        for record in records:
+            runs[record['job_id']] = runs.get(record['job_id'], 0) + 1
+        if records:
+            end_time = max(record['time'] for record in records) - start_time
+            print("{:<8} {:>3} slots {:>6} jobs {:>8.1f} jobs/slot  last finished at {:.1f} s".format(
+                  host, slots, len(records), len(records) / slots, end_time))
+    missing = [job.id for job in jobs if not job.id in runs]
+    print("{} jobs, {} run, {} run more than once, {} not run".format(
+          len(jobs), len(runs), sum(1 for count in runs.values() if count > 1), len(missing)))
+    print("{} jobs left in the queue".format(len(os.listdir(os.path.join(args.folder, "jobs")))))